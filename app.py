@@ -1,14 +1,25 @@
-import requests
+import html
 import random
 import os
+import re
 import json
-import base64
-from datetime import datetime, timedelta
-from requests_oauthlib import OAuth1Session
-import tempfile
-from urllib.parse import urlparse
+import argparse
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+# requests, requests_oauthlib and APScheduler are imported where first used,
+# so the one-shot CLI only pays for what a run actually touches
+from media_cache import MediaCache
+from image_store import ImageStore
+from history_store import HistoryStore
+from post_selector import PostSelector
+from post_queue import PostQueue, QueueWorkers, QUEUE_WORKERS, PermanentFailure, RateLimited, RetryLater
+from templates import POSTED_AT, TWEET_LIMIT, TemplateError
+from catalogue_cache import CatalogueCache
+from similarity import SimilarityIndex, SIMILARITY_THRESHOLD, index_path
+import metrics
 
-# Twitter API configurations for both accounts
+# Twitter API configurations, used when no ACCOUNTS_FILE is present
 TWITTER_ACCOUNTS = {
     'account1': {
         'consumer_key': os.environ.get('CONSUMER_KEY'),
@@ -24,14 +35,53 @@ TWITTER_ACCOUNTS = {
     }
 }
 
+# Optional JSON file listing accounts; values starting with '$' name an env var
+ACCOUNTS_FILE = os.environ.get('ACCOUNTS_FILE', 'accounts.json')
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '8'))
+# Daemon mode: seconds a slot may run late (e.g. after a suspend) and still post
+DAEMON_MISFIRE_GRACE = int(os.environ.get('DAEMON_MISFIRE_GRACE', '300'))
+# One-shot runs post queued jobs for at most this long; the rest wait for the next run
+QUEUE_DRAIN_SECONDS = int(os.environ.get('QUEUE_DRAIN_SECONDS', '120'))
+
+def load_accounts(path=ACCOUNTS_FILE):
+    """Load account credentials from a file, falling back to TWITTER_ACCOUNTS."""
+    try:
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                accounts = json.load(file)['accounts']
+            return {
+                key: {
+                    field: os.environ.get(value[1:]) if isinstance(value, str) and value.startswith('$') else value
+                    for field, value in account.items()
+                }
+                for key, account in accounts.items()
+            }
+    except Exception as e:
+        print(f"Error loading accounts from {path}: {e}")
+    return TWITTER_ACCOUNTS
+
 # API endpoints
 API_URL_POST = 'https://api.twitter.com/2/tweets'
 API_MEDIA_UPLOAD = 'https://upload.twitter.com/1.1/media/upload.json'
+API_USERS_ME = 'https://api.twitter.com/2/users/me'
+API_USER_TWEETS = 'https://api.twitter.com/2/users/{}/tweets'
+# Used when a 429 response carries no x-rate-limit-reset header
+RATE_LIMIT_FALLBACK_SECONDS = 15 * 60
+# Files above this size, and all GIFs, go through the chunked upload endpoint
+CHUNKED_UPLOAD_THRESHOLD = int(os.environ.get('CHUNKED_UPLOAD_THRESHOLD', str(1024 * 1024)))
 
 # Repository information
 REPO_OWNER = 'likhonisaac'
 REPO_NAME = 'Terminals-Pumps'
+# Legacy JSON history, imported once into the SQLite history store
 HISTORY_FILE = 'post_history.json'
+RECENT_WINDOW = timedelta(hours=24)
+# Posts near-identical to anything an account posted this recently are skipped
+SIMILARITY_WINDOW = timedelta(days=int(os.environ.get('SIMILARITY_WINDOW_DAYS', '7')))
+# 'local' reads the checked-out post/post.json first; 'remote' always asks GitHub
+POSTS_SOURCE = os.environ.get('POSTS_SOURCE', 'local')
+LOCAL_POSTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'post', 'post.json')
+IMAGES_DIR = os.environ.get('IMAGES_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'images'))
 IMAGE_FILES = [
     '2thUENv9.jpg',
     'GahDNdIbEAEexOA.jpg',
@@ -39,112 +89,329 @@ IMAGE_FILES = [
     'solana_4-1-1.jpg'
 ]
 
+def same_text(published, text):
+    """Compare tweet texts, ignoring the t.co rewriting of links and the API's HTML escaping."""
+    def strip_links(value):
+        return re.sub(r'https?://\S+', '', value).strip()
+    return strip_links(html.unescape(published)) == strip_links(text)
+
 class TwitterBot:
     def __init__(self):
-        self.posts_history = self.load_posts_history()
-        
-    def load_posts_history(self):
-        try:
-            if os.path.exists(HISTORY_FILE):
-                with open(HISTORY_FILE, 'r') as file:
-                    return json.load(file)
-        except Exception as e:
-            print(f"Error loading history: {e}")
-        return {'account1': {}, 'account2': {}}
+        self.accounts = load_accounts()
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.history = HistoryStore(legacy_json=HISTORY_FILE)
+        self.media_cache = MediaCache()
+        self.image_store = ImageStore(
+            IMAGES_DIR,
+            IMAGE_FILES,
+            remote_base=f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/images'
+        )
+        self.catalogue = CatalogueCache(
+            f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/post/post.json',
+            local_path=LOCAL_POSTS_FILE if POSTS_SOURCE == 'local' else None
+        )
+        # (posts, selector) reused by the daemon while the catalogue is unchanged
+        self.selector = None
+        # (catalogue, posts that fit in a tweet), checked once per catalogue
+        self.postable_posts = None
+        # MinHash index of the current catalogue's content
+        self.similarity = None
+        # Planned posts, stored in the history database
+        self.queue = PostQueue(self.history)
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Recovered {recovered} interrupted post jobs")
+        # account -> Twitter user ID, for checking the timeline after a crash
+        self.user_ids = {}
+        # Resident queue workers in daemon mode
+        self.workers = None
 
-    def save_posts_history(self):
-        try:
-            with open(HISTORY_FILE, 'w') as file:
-                json.dump(self.posts_history, file, indent=2)
-            print(f"Successfully saved history to {HISTORY_FILE}")
-        except Exception as e:
-            print(f"Error saving history: {e}")
+    def save_posts_history(self, job, tweet_id):
+        """Mark a job done and record it in the history, atomically."""
+        with metrics.timer('app_save_history_seconds'):
+            self.queue.complete(job, tweet_id)
+        print(f"Successfully recorded post {job.post_id} for {job.account} in {self.history.path}")
+
+    def get_session(self, account_key):
+        """Return the keep-alive OAuth session for an account, creating it once."""
+        with self.lock:
+            auth = self.sessions.get(account_key)
+            if auth is None:
+                from requests_oauthlib import OAuth1Session
+                account = self.accounts[account_key]
+                auth = OAuth1Session(
+                    account['consumer_key'],
+                    client_secret=account['consumer_secret'],
+                    resource_owner_key=account['access_token'],
+                    resource_owner_secret=account['access_token_secret']
+                )
+                self.sessions[account_key] = auth
+            return auth
 
     def load_posts(self):
         try:
-            url = f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/post/post.json'
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()['posts']
+            with metrics.timer('app_load_posts_seconds'):
+                return self.postable(self.catalogue.load())
         except Exception as e:
             print(f"Error loading posts: {e}")
             return []
 
-    def download_random_image(self):
-        """Download a random image from the repository."""
+    def postable(self, posts):
+        """Return the posts that fit in a tweet with the timestamp appended, compiling each once per catalogue."""
+        with self.lock:
+            if self.postable_posts is None or self.postable_posts[0] is not posts:
+                fitting = []
+                for post in posts:
+                    try:
+                        POSTED_AT.bind({'content': post['content']}, limit=TWEET_LIMIT)
+                        fitting.append(post)
+                    except TemplateError as e:
+                        print(f"Skipping post {post.get('id')}: {e}")
+                self.postable_posts = (posts, fitting)
+                self.similarity = self.load_similarity(fitting)
+            return self.postable_posts[1]
+
+    def similarity_path(self):
+        if self.catalogue.local_path and os.path.exists(self.catalogue.local_path):
+            return index_path(self.catalogue.local_path)
+        return os.path.join(self.catalogue.cache_dir, 'catalogue.minhash.npz')
+
+    def load_similarity(self, posts):
+        """Load the persisted similarity index, hashing only posts added or edited since it was built."""
+        path = self.similarity_path()
         try:
-            image_file = random.choice(IMAGE_FILES)
-            image_url = f'https://raw.githubusercontent.com/{REPO_OWNER}/{REPO_NAME}/main/images/{image_file}'
-            
-            response = requests.get(image_url)
-            response.raise_for_status()
-            
-            # Create a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.jpg')
-            temp_file.write(response.content)
-            temp_file.close()
-            
-            print(f"Successfully downloaded image: {image_file}")
-            return temp_file.name
+            with metrics.timer('app_similarity_load_seconds'):
+                index = SimilarityIndex.load(path)
+                index.refresh(posts)
         except Exception as e:
-            print(f"Error downloading image: {e}")
+            print(f"Error building similarity index: {e}")
+            return None
+        if index.dirty:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                index.save(path)
+            except OSError as e:
+                print(f"Error saving similarity index to {path}: {e}")
+        return index
+
+    def too_similar(self, post_id, recent):
+        """Return (recent post ID, score) if post_id nearly repeats one of the account's recent posts."""
+        if self.similarity is None or not recent:
             return None
+        with metrics.timer('app_similarity_check_seconds'):
+            return self.similarity.too_similar(post_id, recent, SIMILARITY_THRESHOLD)
 
-    def upload_media(self, image_path, auth):
+    def upload_media(self, image_file, auth, account_key=None):
         """Upload media to Twitter and return the media ID."""
+        from http_client import TIMEOUT
         try:
-            # Read the image file
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-            
-            # Upload the image
-            response = auth.post(API_MEDIA_UPLOAD, files={'media': image_data})
-            response.raise_for_status()
-            
-            media_id = response.json()['media_id_string']
+            entry = self.image_store.manifest.get(image_file)
+            if entry and (entry['size'] > CHUNKED_UPLOAD_THRESHOLD or entry['mime'] == 'image/gif'):
+                from chunked_upload import upload_chunked
+                with metrics.timer('app_upload_media_seconds', mode='chunked'):
+                    result = upload_chunked(auth, API_MEDIA_UPLOAD, entry['path'], entry['mime'])
+            else:
+                with metrics.timer('app_upload_media_seconds', mode='simple'), \
+                        self.image_store.open(image_file) as image_data:
+                    # Upload the image straight from the mapped file, no temp copy
+                    response = auth.post(
+                        API_MEDIA_UPLOAD,
+                        files={'media': (image_file, image_data, self.image_store.mime(image_file))},
+                        timeout=TIMEOUT
+                    )
+                    response.raise_for_status()
+                metrics.observe_response(response, 'media/upload')
+                result = response.json()
+
+            media_id = result['media_id_string']
             print(f"Successfully uploaded media with ID: {media_id}")
+            key = self.image_store.cache_key(image_file)
+            if account_key and key:
+                self.media_cache.put(account_key, key, media_id, result.get('expires_after_secs'))
             return media_id
         except Exception as e:
             print(f"Error uploading media: {e}")
             return None
-        finally:
-            # Clean up the temporary file
-            if image_path and os.path.exists(image_path):
-                os.unlink(image_path)
+
+    def get_media_id(self, account_key):
+        """Return a media ID for a random image, uploading only on a cache miss."""
+        image_file = random.choice(IMAGE_FILES)
+        key = self.image_store.cache_key(image_file)
+        if key:
+            media_id = self.media_cache.get(account_key, key)
+            if media_id:
+                print(f"Reusing cached media ID {media_id} for {image_file}")
+                metrics.inc('app_media_cache_total', result='hit')
+                return media_id
+        else:
+            self.media_cache.record_miss()
+        metrics.inc('app_media_cache_total', result='miss')
+
+        media_id = self.upload_media(image_file, self.get_session(account_key), account_key)
+        if not media_id:
+            print("Failed to upload image, proceeding without media")
+        return media_id
 
     def post_tweet(self, content, account_key, media_id=None):
-        try:
-            account = TWITTER_ACCOUNTS[account_key]
-            auth = OAuth1Session(
-                account['consumer_key'],
-                client_secret=account['consumer_secret'],
-                resource_owner_key=account['access_token'],
-                resource_owner_secret=account['access_token_secret']
+        """Post a tweet; raises RateLimited, RetryLater or PermanentFailure if Twitter refuses it."""
+        # Bounded well below the queue lease, so a hung send cannot outlive its claim
+        from http_client import TIMEOUT
+        auth = self.get_session(account_key)
+
+        # Prepare tweet payload
+        payload = {'text': content}
+        if media_id:
+            payload['media'] = {'media_ids': [media_id]}
+
+        with metrics.timer('app_post_tweet_seconds'):
+            response = auth.post(API_URL_POST, json=payload, timeout=TIMEOUT)
+        metrics.observe_response(response, 'tweets')
+        status = response.status_code
+        if status == 429:
+            reset = response.headers.get('x-rate-limit-reset')
+            raise RateLimited(
+                f"Rate limited posting from {account_key}",
+                float(reset) if reset else time.time() + RATE_LIMIT_FALLBACK_SECONDS
             )
-            
-            # Prepare tweet payload
-            payload = {'text': content}
-            if media_id:
-                payload['media'] = {'media_ids': [media_id]}
-            
-            response = auth.post(API_URL_POST, json=payload)
+        if status >= 500:
+            raise RetryLater(f"Twitter returned {status}")
+        if status >= 400:
+            raise PermanentFailure(f"Twitter rejected the tweet ({status}): {response.text[:200]}")
+        # Stop before the next request would be refused
+        if response.headers.get('x-rate-limit-remaining') == '0' and response.headers.get('x-rate-limit-reset'):
+            self.queue.rate_limit(account_key, float(response.headers['x-rate-limit-reset']))
+        return response, auth
+
+    def find_posted_tweet(self, account_key, text, since):
+        """Return the ID of a tweet with this text posted since an epoch time, or None."""
+        from http_client import TIMEOUT
+        auth = self.get_session(account_key)
+        user_id = self.user_ids.get(account_key)
+        if user_id is None:
+            response = auth.get(API_USERS_ME, timeout=TIMEOUT)
             response.raise_for_status()
-            return response, auth
-        except Exception as e:
-            print(f"Error posting tweet: {e}")
-            return None, None
+            user_id = self.user_ids[account_key] = response.json()['data']['id']
+        start_time = datetime.fromtimestamp(since - 60, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        response = auth.get(API_USER_TWEETS.format(user_id), params={'max_results': 100, 'start_time': start_time},
+                            timeout=TIMEOUT)
+        response.raise_for_status()
+        for tweet in response.json().get('data', []):
+            if same_text(tweet.get('text', ''), text):
+                return tweet['id']
+        return None
+
+    def deliver_job(self, job):
+        """Queue handler: post a planned job, first checking the timeline if it may already be out."""
+        if job.state == 'verifying':
+            tweet_id = self.find_posted_tweet(job.account, job.text, job.started_at)
+            if tweet_id:
+                print(f"Post {job.post_id} from {job.account} was already published as {tweet_id}")
+                self.save_posts_history(job, tweet_id)
+                return
+            print(f"Post {job.post_id} from {job.account} was not published; posting it again")
+
+        # Add posting timestamp
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
+        content_with_timestamp = POSTED_AT.render(content=job.content, timestamp=timestamp)
+
+        print(f"Attempting to post tweet {job.post_id} from {job.account} (attempt {job.attempts})")
 
-    def is_recently_posted(self, post_id, account_key):
+        media_id = self.get_media_id(job.account)
+        self.media_cache.save()
+
+        job = self.queue.mark_sending(job, content_with_timestamp)
+        response, _ = self.post_tweet(content_with_timestamp, job.account, media_id)
+        print(f"Successfully posted tweet from {job.account}: {job.post_id}")
+        self.save_posts_history(job, response.json()['data']['id'])
+        metrics.inc('app_tweets_total', outcome='posted')
+
+    def post_for_account(self, selector, account_key):
+        """Pick an eligible post for one account and queue it. Returns the job ID, or None."""
+        if self.queue.has_open_job(account_key):
+            print(f"{account_key} still has a queued post; not planning another")
+            return None
+
+        rejected = set()
         try:
-            account_history = self.posts_history[account_key]
-            if str(post_id) in account_history:
-                last_posted = datetime.fromisoformat(account_history[str(post_id)])
-                time_diff = datetime.now() - last_posted
-                return time_diff < timedelta(hours=24)
+            recent = self.history.recent_post_ids(account_key, SIMILARITY_WINDOW.total_seconds())
+            # Every rejected pick is cooled below, so this ends once the eligible posts run out
+            while True:
+                post_to_tweet = selector.pick(account_key)
+                if not post_to_tweet or str(post_to_tweet['id']) in rejected:
+                    post_to_tweet = None
+                    break
+                match = self.too_similar(str(post_to_tweet['id']), recent)
+                if match is None:
+                    break
+                print(f"Skipping post {post_to_tweet['id']} for {account_key}: "
+                      f"{match[1]:.0%} similar to recent post {match[0]}")
+                rejected.add(str(post_to_tweet['id']))
+                selector.mark_posted(account_key, str(post_to_tweet['id']))
         except Exception as e:
-            print(f"Error checking recent posts: {e}")
-        return False
+            print(f"Error selecting post: {e}")
+            return None
+
+        if not post_to_tweet:
+            if rejected:
+                print(f"All {len(rejected)} eligible posts for {account_key} are too similar to its recent posts.")
+            else:
+                print(f"No available posts for {account_key} at this time.")
+            return None
+
+        post_id = str(post_to_tweet['id'])
+        # At most one planned post per account per hour, however often the run is retried
+        slot = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H')
+        job_id = self.queue.enqueue(account_key, post_id, post_to_tweet['content'], key=f"{account_key}:{slot}")
+        if job_id is None:
+            print(f"{account_key} already has a post planned for {slot}")
+            return None
+        selector.mark_posted(account_key, post_id)
+        print(f"Queued post {post_id} for {account_key}")
+        return job_id
+
+    def drain(self, max_workers=QUEUE_WORKERS, timeout=QUEUE_DRAIN_SECONDS):
+        """Post due jobs until none are left or timeout passes; the rest stay queued for the next run."""
+        QueueWorkers(self.queue, self.deliver_job, max_workers).run_until_idle(timeout)
+        counts = self.queue.counts()
+        waiting = sum(counts.get(state, 0) for state in ('pending', 'verify'))
+        if waiting:
+            print(f"{waiting} queued posts will be retried later")
+
+    def finish_run(self):
+        """Persist the media cache and prune old history once the run's posts are done."""
+        self.media_cache.save()
+        # A resident daemon never restarts, so retention is enforced here rather than only at start-up
+        self.history.prune()
+        self.queue.prune()
+        stats = self.media_cache.stats()
+        print(f"Media cache: {stats['hits']} hits, {stats['misses']} misses")
+        metrics.flush()
+
+    def selector_for(self, posts):
+        """Return a PostSelector for posts, rebuilding it only when the catalogue changed."""
+        with self.lock:
+            if self.selector is None or self.selector[0] is not posts:
+                self.selector = (posts, PostSelector(posts, self.history, RECENT_WINDOW.total_seconds()))
+            return self.selector[1]
+
+    @metrics.timed('app_run_seconds', mode='slot')
+    def post_slot(self, account_key):
+        """Daemon job: queue a post for an account; the resident workers publish it."""
+        posts = self.load_posts()
+        if not posts:
+            print("No posts available to tweet.")
+            return
+        if self.post_for_account(self.selector_for(posts), account_key) and self.workers:
+            self.workers.wake()
+        self.finish_run()
 
+    def next_account(self):
+        """The account that has gone longest without posting, so each takes its turn whatever the cron schedule."""
+        last = self.history.last_post_times()
+        return min(self.accounts, key=lambda key: (self.queue.has_open_job(key), last.get(key, 0)))
+
+    @metrics.timed('app_run_seconds', mode='single')
     def post_updates(self):
         print(f"Starting post updates at {datetime.now()}")
         
@@ -153,61 +420,79 @@ class TwitterBot:
             print("No posts available to tweet.")
             return
 
-        # Determine which account to use based on current time
-        current_minute = datetime.now().minute
-        account_key = 'account1' if current_minute % 60 < 30 else 'account2'
+        account_key = self.next_account()
         print(f"Using {account_key} for this update")
 
-        # Filter out recently posted content
-        available_posts = [
-            p for p in posts 
-            if not self.is_recently_posted(p['id'], account_key)
-        ]
+        self.post_for_account(PostSelector(posts, self.history, RECENT_WINDOW.total_seconds()), account_key)
+        # Also picks up jobs left over from earlier runs
+        self.drain()
+        self.finish_run()
 
-        if not available_posts:
-            print(f"No available posts for {account_key} at this time.")
-            return
+    @metrics.timed('app_run_seconds', mode='batch')
+    def post_batch(self, account_keys=None, max_workers=BATCH_WORKERS):
+        """Queue a post for several accounts and drain them concurrently, reusing one session per account."""
+        print(f"Starting batch post updates at {datetime.now()}")
 
-        # Download random image
-        image_path = self.download_random_image()
-        if not image_path:
-            print("Failed to download image, proceeding without media")
+        posts = self.load_posts()
+        if not posts:
+            print("No posts available to tweet.")
+            return {}
 
-        # Select and post tweet
-        post_to_tweet = random.choice(available_posts)
-        content = post_to_tweet['content']
-        post_id = str(post_to_tweet['id'])
+        selector = PostSelector(posts, self.history, RECENT_WINDOW.total_seconds())
+        account_keys = list(account_keys or self.accounts)
+        jobs = {key: self.post_for_account(selector, key) for key in account_keys}
+        self.drain(max_workers=max_workers)
+        results = {key: job_id is not None and self.queue.state(job_id) == 'done' for key, job_id in jobs.items()}
 
-        # Add posting timestamp
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S UTC")
-        content_with_timestamp = f"{content}\n\nPosted at: {timestamp}"
+        succeeded = sum(results.values())
+        print(f"Batch finished: {succeeded}/{len(account_keys)} accounts posted")
+        self.finish_run()
+        return results
 
-        print(f"Attempting to post tweet {post_id} from {account_key}")
-        
-        media_id = None
-        if image_path:
-            # First create OAuth session for media upload
-            account = TWITTER_ACCOUNTS[account_key]
-            auth = OAuth1Session(
-                account['consumer_key'],
-                client_secret=account['consumer_secret'],
-                resource_owner_key=account['access_token'],
-                resource_owner_secret=account['access_token_secret']
-            )
-            media_id = self.upload_media(image_path, auth)
+def account_slots(account_keys):
+    """Minute of the hour at which each account posts, spread evenly across the hour."""
+    return {key: i * 60 // len(account_keys) for i, key in enumerate(account_keys)}
 
-        response, _ = self.post_tweet(content_with_timestamp, account_key, media_id)
-        
-        if response and response.status_code in (200, 201):
-            print(f"Successfully posted tweet from {account_key}: {post_id}")
-            self.posts_history[account_key][post_id] = datetime.now().isoformat()
-            self.save_posts_history()
-        else:
-            print(f"Failed to post tweet from {account_key}")
+def run_daemon(bot, account_keys=None, max_workers=BATCH_WORKERS):
+    """Stay resident: queue a post for each account at its own slot every hour and drain the queue continuously."""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    # Warm the catalogue and selector before the first slot
+    bot.selector_for(bot.load_posts())
+    bot.workers = QueueWorkers(bot.queue, bot.deliver_job, max_workers)
+    bot.workers.start()
+    scheduler = BlockingScheduler(timezone='UTC')
+    for account_key, minute in account_slots(list(account_keys or bot.accounts)).items():
+        scheduler.add_job(
+            bot.post_slot, 'cron', minute=minute, args=[account_key], id=f'post-{account_key}',
+            max_instances=1, coalesce=True, misfire_grace_time=DAEMON_MISFIRE_GRACE
+        )
+        print(f"Scheduled {account_key} at minute {minute:02d} of every hour")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        print("Daemon stopped")
+    finally:
+        bot.workers.stop()
+        bot.finish_run()
+        bot.history.close()
 
 def main():
+    parser = argparse.ArgumentParser(description='Post updates to Twitter')
+    parser.add_argument('--batch', action='store_true', help='post to every configured account in one run')
+    parser.add_argument('--accounts', help='comma-separated account keys to post to in batch or daemon mode')
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help='concurrent accounts in batch or daemon mode')
+    parser.add_argument('--daemon', action='store_true', help='stay resident and post for each account on its own hourly slot')
+    args = parser.parse_args()
+
     bot = TwitterBot()
-    bot.post_updates()
+    if args.daemon:
+        run_daemon(bot, args.accounts.split(',') if args.accounts else None, max_workers=args.workers)
+    elif args.batch or args.accounts:
+        account_keys = args.accounts.split(',') if args.accounts else None
+        bot.post_batch(account_keys, max_workers=args.workers)
+    else:
+        bot.post_updates()
 
 if __name__ == "__main__":
     main()
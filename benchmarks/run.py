@@ -0,0 +1,378 @@
+"""Offline benchmarks for app.py, post/update_data.py and updates/bot.py.
+
+Every external API is replaced by a local stand-in from stubs.py, so runs
+are repeatable and need no credentials or network. Results are written as
+JSON for comparison between commits:
+
+    python benchmarks/run.py --iterations 20 --latency 0.05 --output bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_TOKEN = '123456:ABCdefGHIjklMNOpqrSTUvwxYZ012345678'
+SCENARIOS = ('post_updates', 'send_main_post', 'post_hourly_update', 'update_data', 'selector', 'post_batch', 'similarity', 'recovery')
+
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+from stubs import CoinGeckoStub, StubConfig, TelegramStub, TwitterStub  # noqa: E402
+
+
+def summarize(samples):
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Run func with its console output swallowed; return (seconds, result)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        return time.perf_counter() - started, result
+
+
+def measure(func, iterations):
+    """Time func over several iterations, reporting the first (cold) run separately."""
+    samples = [timed(func)[0] for _ in range(iterations)]
+    result = summarize(samples[1:] or samples)
+    result['cold_ms'] = samples[0] * 1000
+    return result
+
+
+def generate_catalogue(path, count, seed=7):
+    rng = random.Random(seed)
+    words = ['solana', 'pump', 'airdrop', 'launch', 'holders', 'chart', 'volume', 'moon', 'dip', 'community']
+    posts = [
+        {'id': i, 'content': ' '.join(rng.choice(words) for _ in range(rng.randint(8, 30))),
+         'weight': rng.choice([1, 1, 1, 2, 5])}
+        for i in range(1, count + 1)
+    ]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'posts': posts}, f)
+    return posts
+
+
+def bench_accounts(count, prefix='bench'):
+    credential = {'consumer_key': 'k', 'consumer_secret': 's', 'access_token': 't', 'access_token_secret': 'x'}
+    return {f'{prefix}{i}': dict(credential) for i in range(count)}
+
+
+class Harness:
+    """Starts the stand-ins and points every module at them."""
+
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        config = StubConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.retry_after)
+        self.twitter = TwitterStub(config).start()
+        self.telegram = TelegramStub(config).start()
+        self.coingecko = CoinGeckoStub(config, coins=args.coins).start()
+
+        os.environ.update({
+            'BOT_TOKEN': BENCH_TOKEN,
+            'CHANNELS': os.environ.get('BENCH_CHANNELS', '-1001:6'),
+            'CACHE_DIR': os.path.join(workdir, '.cache'),
+        })
+        for path in (ROOT, os.path.join(ROOT, 'updates'), os.path.join(ROOT, 'post')):
+            if path not in sys.path:
+                sys.path.insert(0, path)
+
+        import app
+        import bot
+        import market_data
+        import update_data
+        import watchlist
+        from telegram import Bot
+
+        # A copy of the catalogue, so the similarity index built beside it stays out of the source tree
+        catalogue = os.path.join(workdir, 'post', 'post.json')
+        os.makedirs(os.path.dirname(catalogue), exist_ok=True)
+        shutil.copy(os.path.join(ROOT, 'post', 'post.json'), catalogue)
+        app.LOCAL_POSTS_FILE = catalogue
+
+        coingecko = f"{self.coingecko.url}/api/v3"
+        app.API_URL_POST = f"{self.twitter.url}/2/tweets"
+        app.API_MEDIA_UPLOAD = f"{self.twitter.url}/1.1/media/upload.json"
+        app.API_USERS_ME = f"{self.twitter.url}/2/users/me"
+        app.API_USER_TWEETS = f"{self.twitter.url}/2/users/{{}}/tweets"
+        market_data.COINGECKO_URL = f"{coingecko}/coins/markets"
+        watchlist.SIMPLE_PRICE_URL = f"{coingecko}/simple/price"
+        update_data.TRENDING_API_URL = f"{coingecko}/search/trending"
+        bot.bot = Bot(token=BENCH_TOKEN, base_url=f"{self.telegram.url}/bot")
+        # Every iteration must reach the stand-in, not the in-process snapshot
+        bot.market_data.ttl = 0
+        self.app_module, self.bot_module, self.update_data_module = app, bot, update_data
+
+    def stop(self):
+        for server in (self.twitter, self.telegram, self.coingecko):
+            server.stop()
+
+    def requests(self):
+        return {
+            'twitter': dict(self.twitter.counts),
+            'telegram': dict(self.telegram.counts),
+            'coingecko': dict(self.coingecko.counts),
+        }
+
+    def post_updates(self):
+        """One cron-style run: a fresh TwitterBot per iteration, on-disk caches kept between runs."""
+        app = self.app_module
+        runs = iter(range(self.args.iterations))
+
+        def run():
+            twitter_bot = app.TwitterBot()
+            # Fresh accounts each run, as the queue plans one post per account per hour
+            twitter_bot.accounts = bench_accounts(2, prefix=f'run{next(runs)}-')
+            twitter_bot.post_updates()
+            twitter_bot.history.close()
+
+        return measure(run, self.args.iterations)
+
+    def send_main_post(self):
+        return measure(lambda: self.bot_module.send_main_post(self.args.image_url), self.args.iterations)
+
+    def post_hourly_update(self):
+        return measure(lambda: self.bot_module.post_hourly_update(self.args.image_url), self.args.iterations)
+
+    def update_data(self):
+        # Runs in the working directory, against the catalogue copy made above
+        return measure(self.update_data_module.main, self.args.iterations)
+
+    def selector(self):
+        """Pick throughput for a large catalogue across many accounts, without I/O."""
+        from post_selector import PostSelector
+
+        posts = generate_catalogue(os.path.join(self.workdir, 'selector.json'), self.args.posts)
+        started = time.perf_counter()
+        selector = PostSelector(posts)
+        build = time.perf_counter() - started
+
+        accounts = [f'bench{i}' for i in range(self.args.accounts)]
+        picks_per_account = min(self.args.posts, 100)
+        samples = []
+        started = time.perf_counter()
+        for _ in range(picks_per_account):
+            for account in accounts:
+                pick_started = time.perf_counter()
+                post = selector.pick(account)
+                if post:
+                    selector.mark_posted(account, str(post['id']))
+                samples.append(time.perf_counter() - pick_started)
+        elapsed = time.perf_counter() - started
+        result = summarize(samples)
+        result.update({
+            'posts': self.args.posts,
+            'accounts': len(accounts),
+            'build_ms': build * 1000,
+            'picks_per_second': len(samples) / elapsed,
+        })
+        return result
+
+    def similarity(self):
+        """Index build and near-duplicate lookups for a large catalogue with templated variants."""
+        from similarity import SimilarityIndex, SIMILARITY_THRESHOLD
+
+        rng = random.Random(11)
+        vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+                      for _ in range(5000)]
+        posts = []
+        for i in range(1, self.args.posts + 1):
+            if posts and rng.random() < 0.1:
+                # Same text as an earlier post with other numbers and handles
+                base = rng.choice(posts)['content']
+                content = f"{base} win {rng.randint(1, 999)} $SOL follow @user{rng.randint(1, 99999)}"
+            else:
+                content = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(12, 40)))
+            posts.append({'id': i, 'content': content})
+
+        index = SimilarityIndex()
+        build = timed(index.refresh, posts)[0]
+        path = os.path.join(self.workdir, 'catalogue.minhash.npz')
+        save = timed(index.save, path)[0]
+        load = timed(SimilarityIndex.load, path)[0]
+
+        # Each lookup checks one candidate against a week of hourly posts
+        post_ids = [str(post['id']) for post in posts]
+        samples = []
+        rejected = 0
+        for _ in range(2000):
+            recent = set(rng.sample(post_ids, min(168, len(post_ids))))
+            candidate = rng.choice(post_ids)
+            started = time.perf_counter()
+            if index.too_similar(candidate, recent, SIMILARITY_THRESHOLD):
+                rejected += 1
+            samples.append(time.perf_counter() - started)
+        result = summarize(samples)
+        result.update({
+            'posts': len(posts),
+            'build_ms': build * 1000,
+            'save_ms': save * 1000,
+            'load_ms': load * 1000,
+            'index_bytes': os.path.getsize(path),
+            'near_duplicate_pairs': len(index.near_duplicates(SIMILARITY_THRESHOLD)),
+            'rejected': rejected,
+        })
+        return result
+
+    def recovery(self):
+        """A worker dies after its tweet is sent but before it is recorded; the retry must not repost it."""
+        app = self.app_module
+        runs = iter(range(self.args.iterations))
+        reposted = []
+
+        def run():
+            twitter_bot = app.TwitterBot()
+            prefix = f'recover{next(runs)}-'
+            account = f'{prefix}0'
+            twitter_bot.accounts = bench_accounts(1, prefix=prefix)
+            twitter_bot.drain()
+            # The timeline returns '&' escaped, and most catalogue posts contain one
+            post = next(p for p in twitter_bot.load_posts() if '&' in p['content'])
+            queue = twitter_bot.queue
+            queue.enqueue(account, str(post['id']), post['content'], key=f'{account}:recovery')
+            job = queue.claim()
+            text = app.POSTED_AT.render(content=job.content, timestamp=time.strftime('%Y-%m-%d %H:%M:%S UTC'))
+            job = queue.mark_sending(job, text)
+            # Injected failures refuse the send; retry it, since only an accepted tweet can be reposted
+            while True:
+                try:
+                    twitter_bot.post_tweet(text, account)
+                    break
+                except app.RetryLater as e:
+                    time.sleep(min(e.retry_after or 0.1, 1.0))
+            # The lease runs out and the job is handed to the next worker to verify
+            queue.recover(now=time.time() + queue.lease + 1)
+            sent = len(self.twitter.tweets)
+            twitter_bot.drain()
+            reposted.append(len(self.twitter.tweets) - sent)
+            twitter_bot.history.close()
+
+        result = measure(run, self.args.iterations)
+        result['reposted'] = sum(reposted)
+        return result
+
+    def post_batch(self):
+        """One batch run posting to every account against a large catalogue."""
+        from catalogue_cache import CatalogueCache
+
+        path = os.path.join(self.workdir, 'catalogue.json')
+        generate_catalogue(path, self.args.posts)
+        runs = []
+        for run in range(max(1, self.args.batch_runs)):
+            twitter_bot = self.app_module.TwitterBot()
+            twitter_bot.accounts = bench_accounts(self.args.accounts, prefix=f'batch{run}-')
+            twitter_bot.catalogue = CatalogueCache(twitter_bot.catalogue.url, local_path=path)
+            elapsed, results = timed(twitter_bot.post_batch, max_workers=self.args.workers)
+            twitter_bot.history.close()
+            runs.append((elapsed, sum((results or {}).values())))
+        result = summarize([elapsed for elapsed, _ in runs])
+        result.update({
+            'posts': self.args.posts,
+            'accounts': self.args.accounts,
+            'workers': self.args.workers,
+            'posted': runs[-1][1],
+            'posts_per_second': sum(posted for _, posted in runs) / sum(elapsed for elapsed, _ in runs),
+        })
+        return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the bots against local API stand-ins')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    parser.add_argument('--iterations', type=int, default=10, help='runs per latency scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every stand-in response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503, help='HTTP status for injected failures')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with failures')
+    parser.add_argument('--posts', type=int, default=10000, help='catalogue size for the scale scenarios')
+    parser.add_argument('--accounts', type=int, default=50, help='accounts for the scale scenarios')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent accounts in post_batch')
+    parser.add_argument('--batch-runs', type=int, default=3, help='post_batch runs')
+    parser.add_argument('--coins', type=int, default=250, help='coins served by the CoinGecko stand-in')
+    parser.add_argument('--image-url', default='https://example.invalid/update.gif', help='media sent to Telegram')
+    parser.add_argument('--output', default='bench_results.json', help='where to write the JSON results')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    output = os.path.abspath(args.output)
+
+    logging.basicConfig(level=logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    cwd = os.getcwd()
+    # History DB, media cache and catalogue cache all live in the working directory
+    os.chdir(workdir)
+    harness = Harness(args, workdir)
+    results = {}
+    try:
+        for name in scenarios:
+            print(f"Running {name}...", file=sys.stderr)
+            try:
+                results[name] = getattr(harness, name)()
+            except Exception as e:
+                # Record the failure and carry on, so one broken scenario does not lose the others
+                print(f"{name} failed: {e!r}", file=sys.stderr)
+                results[name] = {'error': repr(e)}
+    finally:
+        harness.stop()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': vars(args),
+        'results': results,
+        'requests': harness.requests(),
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    for name, result in results.items():
+        summary = ', '.join(f"{key} {value:.2f}" if isinstance(value, float) else f"{key} {value}"
+                            for key, value in result.items())
+        print(f"{name}: {summary}", file=sys.stderr)
+    print(f"Results written to {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
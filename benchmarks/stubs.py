@@ -0,0 +1,212 @@
+"""Local stand-ins for the Twitter, Telegram Bot and CoinGecko HTTP APIs.
+
+Each server answers just enough of the real API for the bots to run end to
+end, with configurable latency and error injection.
+"""
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubConfig:
+    """Latency (seconds, plus up to jitter extra) and the fraction of requests that fail."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8') if status != 204 else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        server.count(url.path)
+        body = self._body() if method == 'POST' else b''
+        config = server.config
+        if config.latency or config.jitter:
+            time.sleep(config.latency + random.uniform(0, config.jitter))
+        if config.error_rate and random.random() < config.error_rate:
+            headers = {'Retry-After': str(config.retry_after)} if config.retry_after is not None else None
+            server.count('errors')
+            return self._send(config.error_status, server.error_payload(config.error_status), headers)
+        status, payload = server.route(method, url.path, parse_qs(url.query), body, self.headers)
+        self._send(status, payload)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.config = config or StubConfig()
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def count(self, key):
+        with self.counts_lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def error_payload(self, status):
+        return {'error': 'injected', 'status': status}
+
+    def route(self, method, path, query, body, headers):
+        return 404, {'error': f'no route for {method} {path}'}
+
+
+class TwitterStub(StubServer):
+    """POST /2/tweets, the timeline lookups and /1.1/media/upload.json, including the chunked commands."""
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.next_id = 1000
+        self.tweets = []
+
+    def _id(self):
+        with self.counts_lock:
+            self.next_id += 1
+            return str(self.next_id)
+
+    def route(self, method, path, query, body, headers):
+        if method == 'POST' and path == '/2/tweets':
+            payload = json.loads(body or b'{}')
+            tweet = {'id': self._id(), 'text': payload.get('text', '')}
+            self.tweets.append(tweet)
+            return 201, {'data': tweet}
+        if path == '/2/users/me':
+            return 200, {'data': {'id': '1', 'name': 'stub', 'username': 'stub'}}
+        if path.startswith('/2/users/') and path.endswith('/tweets'):
+            # Like the real API, timeline text comes back with &, < and > HTML-escaped
+            timeline = [{**tweet, 'text': html.escape(tweet['text'], quote=False)} for tweet in self.tweets[-100:][::-1]]
+            return 200, {'data': timeline, 'meta': {'result_count': len(timeline)}}
+        if path == '/1.1/media/upload.json':
+            # APPEND is multipart; INIT/FINALIZE are form-encoded; a plain upload has no command
+            if b'APPEND' in body[:2048]:
+                return 204, {}
+            if method == 'GET':
+                return 200, {'media_id_string': query.get('media_id', ['0'])[0],
+                             'processing_info': {'state': 'succeeded'}}
+            return 200, {'media_id_string': self._id(), 'expires_after_secs': 86400}
+        return super().route(method, path, query, body, headers)
+
+
+class TelegramStub(StubServer):
+    """POST /bot<token>/<method> for sendPhoto and editMessageMedia."""
+
+    def error_payload(self, status):
+        payload = {'ok': False, 'error_code': status, 'description': 'Injected failure'}
+        if status == 429 and self.config.retry_after is not None:
+            payload['parameters'] = {'retry_after': self.config.retry_after}
+        return payload
+
+    def route(self, method, path, query, body, headers):
+        api_method = path.rsplit('/', 1)[-1]
+        if api_method in ('sendPhoto', 'editMessageMedia', 'sendMessage'):
+            return 200, {'ok': True, 'result': {
+                'message_id': 6,
+                'date': int(time.time()),
+                'chat': {'id': -100, 'type': 'channel'},
+                'photo': [{'file_id': 'stub-file-id', 'file_unique_id': 'stub', 'width': 640, 'height': 480}],
+            }}
+        if api_method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'stub', 'username': 'stub_bot'}}
+        return 404, {'ok': False, 'description': f'unknown method {api_method}'}
+
+
+class CoinGeckoStub(StubServer):
+    """GET /api/v3/coins/markets, /api/v3/simple/price and /api/v3/search/trending with synthetic data."""
+
+    def __init__(self, config=None, coins=250, sparkline_points=168):
+        super().__init__(config)
+        rng = random.Random(42)
+        self.coins = [
+            {'id': f'coin-{i}', 'symbol': f'c{i}', 'name': f'Coin {i}',
+             'price': rng.uniform(0.01, 60000), 'rank': i + 1}
+            for i in range(coins)
+        ]
+        self.by_id = {coin['id']: coin for coin in self.coins}
+        self.by_id.update({'bitcoin': self.coins[0], 'ethereum': self.coins[1 % coins]})
+        self.sparkline_points = sparkline_points
+
+    def _market_row(self, coin, sparkline):
+        row = {
+            'id': coin['id'], 'symbol': coin['symbol'], 'name': coin['name'],
+            'current_price': coin['price'], 'market_cap': coin['price'] * 1e7,
+            'total_volume': coin['price'] * 1e5, 'market_cap_rank': coin['rank'],
+            'price_change_percentage_24h': 1.5, 'price_change_percentage_7d_in_currency': -2.5,
+        }
+        if sparkline:
+            rng = random.Random(coin['rank'])
+            price, points = coin['price'], []
+            for _ in range(self.sparkline_points):
+                price *= 1 + rng.gauss(0, 0.01)
+                points.append(price)
+            row['sparkline_in_7d'] = {'price': points}
+        return row
+
+    def route(self, method, path, query, body, headers):
+        if path == '/api/v3/coins/markets':
+            sparkline = query.get('sparkline', ['false'])[0] == 'true'
+            if 'ids' in query:
+                coins = [self.by_id[c] for c in query['ids'][0].split(',') if c in self.by_id]
+            else:
+                coins = self.coins[:int(query.get('per_page', ['100'])[0])]
+            return 200, [self._market_row(coin, sparkline) for coin in coins]
+        if path == '/api/v3/simple/price':
+            return 200, {
+                coin_id: {'usd': self.by_id[coin_id]['price'], 'usd_market_cap': 1e9,
+                          'usd_24h_vol': 1e8, 'usd_24h_change': 0.5}
+                for coin_id in query.get('ids', [''])[0].split(',') if coin_id in self.by_id
+            }
+        if path == '/api/v3/search/trending':
+            return 200, {'coins': [
+                {'item': {'name': coin['name'], 'symbol': coin['symbol'], 'market_cap_rank': coin['rank'],
+                          'price_btc': coin['price'] / 60000, 'slug': coin['id']}}
+                for coin in self.coins[:7]
+            ]}
+        return super().route(method, path, query, body, headers)
@@ -0,0 +1,110 @@
+import json
+import os
+
+CACHE_DIR = os.environ.get('CACHE_DIR', '.cache')
+
+
+class CatalogueCache:
+    """Loads post.json from a local file or via conditional GET, caching the parsed posts in memory."""
+
+    def __init__(self, url, local_path=None, cache_dir=CACHE_DIR):
+        self.url = url
+        self.local_path = local_path
+        self.cache_dir = cache_dir
+        self.meta_path = os.path.join(cache_dir, 'catalogue.json')
+        # Raw JSON body of the last remote download, valid for the key in meta
+        self.body_path = os.path.join(cache_dir, 'catalogue.body.json')
+        # (key, posts) of the last catalogue loaded by this process
+        self.memory = None
+
+    def load(self):
+        """Return the list of posts, preferring the local file when it exists."""
+        if self.local_path and os.path.exists(self.local_path):
+            return self.load_local()
+        return self.load_remote()
+
+    def load_local(self):
+        stat = os.stat(self.local_path)
+        key = f"file:{os.path.abspath(self.local_path)}:{stat.st_mtime_ns}:{stat.st_size}"
+        if self.memory and self.memory[0] == key:
+            print(f"Using cached catalogue for {self.local_path}")
+            return self.memory[1]
+        with open(self.local_path, 'r', encoding='utf-8') as f:
+            posts = json.load(f)['posts']
+        self.memory = (key, posts)
+        print(f"Loaded {len(posts)} posts from {self.local_path}")
+        return posts
+
+    def load_remote(self):
+        import requests
+
+        meta = self.read_meta()
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        response = requests.get(self.url, headers=headers, timeout=30)
+        if response.status_code == 304:
+            posts = self.cached(meta.get('key'))
+            if posts is not None:
+                print("Remote catalogue not modified, using cached posts")
+                return posts
+            # Lost the parsed copy; fetch the full body again
+            response = requests.get(self.url, timeout=30)
+        response.raise_for_status()
+
+        posts = response.json()['posts']
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        key = f"url:{self.url}:{etag or last_modified or ''}"
+        self.memory = (key, posts)
+        # Body first, so the metadata never points at an older body
+        if self.write_body(response.content):
+            self.write_meta({'key': key, 'etag': etag, 'last_modified': last_modified})
+        print(f"Downloaded {len(posts)} posts from {self.url}")
+        return posts
+
+    def cached(self, key):
+        """Return the posts of the remote catalogue stored under key, from memory or disk, or None."""
+        if not key:
+            return None
+        if self.memory and self.memory[0] == key:
+            return self.memory[1]
+        try:
+            with open(self.body_path, 'r', encoding='utf-8') as f:
+                posts = json.load(f)['posts']
+        except Exception:
+            return None
+        self.memory = (key, posts)
+        return posts
+
+    def write_body(self, body):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.body_path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, self.body_path)
+            return True
+        except Exception as e:
+            print(f"Error writing catalogue cache: {e}")
+            return False
+
+    def read_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def write_meta(self, meta):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.meta_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.meta_path)
+        except Exception as e:
+            print(f"Error writing catalogue cache metadata: {e}")
@@ -0,0 +1,92 @@
+import mmap
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from http_client import TIMEOUT
+
+# Twitter accepts APPEND segments of up to 5 MB
+CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+APPEND_WORKERS = int(os.environ.get('UPLOAD_APPEND_WORKERS', '3'))
+SEGMENT_RETRIES = 3
+STATUS_POLL_LIMIT = 30
+
+
+def media_category(media_type):
+    """Map a mime type to the media_category the upload endpoint expects."""
+    if media_type == 'image/gif':
+        return 'tweet_gif'
+    if media_type.startswith('video/'):
+        return 'tweet_video'
+    return 'tweet_image'
+
+
+def _command(auth, url, data, files=None):
+    response = auth.post(url, data=data, files=files, timeout=TIMEOUT)
+    response.raise_for_status()
+    # APPEND answers with an empty 204 body
+    return response.json() if response.content else {}
+
+
+def _append_segment(auth, url, media_id, data, index, chunk_size, max_retries):
+    """Send one segment, retrying only that segment on failure."""
+    start = index * chunk_size
+    for attempt in range(max_retries):
+        try:
+            # Slicing the map copies just this segment into memory
+            segment = data[start:start + chunk_size]
+            _command(
+                auth, url,
+                data={'command': 'APPEND', 'media_id': media_id, 'segment_index': index},
+                files={'media': segment}
+            )
+            return
+        except requests.RequestException as e:
+            if attempt + 1 == max_retries:
+                raise
+            print(f"Error uploading segment {index} (attempt {attempt + 1}): {e}")
+            time.sleep(2 ** attempt)
+
+
+def _wait_for_processing(auth, url, media_id, result):
+    """Poll STATUS until asynchronous processing (GIFs, video) has finished."""
+    for _ in range(STATUS_POLL_LIMIT):
+        info = result.get('processing_info')
+        if not info or info.get('state') == 'succeeded':
+            return result
+        if info.get('state') == 'failed':
+            raise RuntimeError(f"Media processing failed: {info.get('error')}")
+        time.sleep(info.get('check_after_secs', 1))
+        response = auth.get(url, params={'command': 'STATUS', 'media_id': media_id}, timeout=TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+    raise TimeoutError(f"Media {media_id} still processing after {STATUS_POLL_LIMIT} checks")
+
+
+def upload_chunked(auth, url, path, media_type, chunk_size=CHUNK_SIZE,
+                   workers=APPEND_WORKERS, max_retries=SEGMENT_RETRIES):
+    """Upload a file with INIT/APPEND/FINALIZE, streaming it in fixed-size segments."""
+    total_bytes = os.path.getsize(path)
+    init = _command(auth, url, data={
+        'command': 'INIT',
+        'total_bytes': total_bytes,
+        'media_type': media_type,
+        'media_category': media_category(media_type),
+    })
+    media_id = init['media_id_string']
+
+    segment_count = (total_bytes + chunk_size - 1) // chunk_size
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, segment_count))) as executor:
+            futures = [
+                executor.submit(_append_segment, auth, url, media_id, data, index, chunk_size, max_retries)
+                for index in range(segment_count)
+            ]
+            for future in futures:
+                future.result()
+    print(f"Uploaded {segment_count} segments ({total_bytes} bytes) for media {media_id}")
+
+    result = _command(auth, url, data={'command': 'FINALIZE', 'media_id': media_id})
+    return _wait_for_processing(auth, url, media_id, result)
@@ -0,0 +1,104 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+HISTORY_DB = os.environ.get('HISTORY_DB', 'post_history.db')
+# Entries older than this are pruned; must exceed the longest posting cooldown
+RETENTION_SECONDS = int(os.environ.get('HISTORY_RETENTION_DAYS', '30')) * 24 * 60 * 60
+
+
+class HistoryStore:
+    """SQLite-backed post history indexed by (account, post_id, posted_at)."""
+
+    def __init__(self, path=HISTORY_DB, legacy_json=None, retention=RETENTION_SECONDS):
+        self.path = path
+        self.retention = retention
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                account TEXT NOT NULL,
+                post_id TEXT NOT NULL,
+                posted_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS history_account_time ON history (account, posted_at);
+            CREATE INDEX IF NOT EXISTS history_account_post ON history (account, post_id, posted_at);
+        """)
+        if legacy_json:
+            self.import_json(legacy_json)
+        self.prune()
+
+    def import_json(self, path):
+        """One-off import of the old post_history.json layout into an empty store.
+
+        The file is renamed afterwards, so a store created later (e.g. on a
+        fresh machine) does not pick up the same stale history again.
+        """
+        if not os.path.exists(path):
+            return
+        with self.lock:
+            if self.conn.execute('SELECT 1 FROM history LIMIT 1').fetchone():
+                return
+            try:
+                with open(path, 'r') as file:
+                    legacy = json.load(file)
+                rows = [
+                    (account, str(post_id), datetime.fromisoformat(posted_at).timestamp())
+                    for account, posts in legacy.items()
+                    for post_id, posted_at in posts.items()
+                ]
+                with self.conn:
+                    self.conn.executemany('INSERT INTO history VALUES (?, ?, ?)', rows)
+                os.replace(path, f"{path}.imported")
+                print(f"Imported {len(rows)} history entries from {path}")
+            except Exception as e:
+                print(f"Error importing history from {path}: {e}")
+
+    def insert(self, account, post_id, posted_at=None):
+        """Append one posting; the caller holds the lock and commits, e.g. with the job that sent it."""
+        self.conn.execute(
+            'INSERT INTO history VALUES (?, ?, ?)',
+            (account, str(post_id), posted_at or time.time())
+        )
+
+    def recent_post_ids(self, account, window_seconds, now=None):
+        """Return the IDs an account posted within the last window_seconds."""
+        since = (now or time.time()) - window_seconds
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT DISTINCT post_id FROM history WHERE account = ? AND posted_at >= ?',
+                (account, since)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def last_posted_times(self, account, since):
+        """Return {post_id: latest posted_at} for an account's postings since an epoch time."""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT post_id, MAX(posted_at) FROM history '
+                'WHERE account = ? AND posted_at >= ? GROUP BY post_id',
+                (account, since)
+            ).fetchall()
+        return dict(rows)
+
+    def last_post_times(self):
+        """Return {account: epoch time of its latest posting}."""
+        with self.lock:
+            rows = self.conn.execute('SELECT account, MAX(posted_at) FROM history GROUP BY account').fetchall()
+        return dict(rows)
+
+    def prune(self):
+        """Delete postings older than the retention period; called at start-up and after every run."""
+        with self.lock, self.conn:
+            deleted = self.conn.execute(
+                'DELETE FROM history WHERE posted_at < ?',
+                (time.time() - self.retention,)
+            ).rowcount
+        if deleted:
+            print(f"Pruned {deleted} history entries older than {self.retention // 86400} days")
+
+    def close(self):
+        self.conn.close()
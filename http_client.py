@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# (connect, read) timeout in seconds; no request may hang indefinitely
+TIMEOUT = (5, 30)
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', '4'))
+BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', '1'))
+BACKOFF_CAP = float(os.environ.get('HTTP_BACKOFF_CAP', '60'))
+# Total seconds one call may spend waiting between retries; a longer Retry-After ends the retries
+RETRY_BUDGET = float(os.environ.get('HTTP_RETRY_BUDGET', '300'))
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '10'))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Optional response cache for offline or replay runs:
+#   off      - no caching (default)
+#   record   - store every successful response
+#   fallback - store responses and serve the stored copy when the network fails
+#   replay   - serve only stored responses, never touch the network
+CACHE_MODE = os.environ.get('HTTP_CACHE_MODE', 'off')
+CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', os.path.join(os.environ.get('CACHE_DIR', '.cache'), 'http'))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class RetryableHTTPError(requests.HTTPError):
+    """A 429/5xx response, carrying the server's Retry-After delay if it sent one."""
+
+    def __init__(self, message, response=None, retry_after=None):
+        super().__init__(message, response=response)
+        self.retry_after = retry_after
+
+
+def get_session():
+    """Return the process-wide keep-alive session."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount('https://', adapter)
+            _session.mount('http://', adapter)
+        return _session
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header (seconds or HTTP date) to seconds, or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, error=None, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Seconds to wait before retry number attempt: Retry-After as sent if given, else full-jitter backoff."""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _plan_retry(url, attempt, error, backoff, waited, budget):
+    """Return the delay before the next attempt, or None if it would overrun the retry budget."""
+    delay = retry_delay(attempt, error, base=backoff)
+    if waited + delay > budget:
+        logging.warning(f"Request to {url} failed (attempt {attempt + 1}): {error}; "
+                        f"server asked to wait {delay:.1f}s, beyond the {budget:.0f}s retry budget")
+        return None
+    metrics.inc('http_retries_total', host=urlparse(url).netloc)
+    logging.warning(f"Request to {url} failed (attempt {attempt + 1}): {error}; retrying in {delay:.1f}s")
+    return delay
+
+
+def _cache_path(url, params):
+    key = json.dumps([url, sorted((params or {}).items())], default=str)
+    return os.path.join(CACHE_DIR, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def _cache_read(url, params):
+    try:
+        with open(_cache_path(url, params), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _cache_write(url, params, data):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path = _cache_path(url, params)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Failed to write HTTP cache for {url}: {e}")
+
+
+def request_json(url, params=None, timeout=TIMEOUT):
+    """Perform a single GET and return the decoded JSON body."""
+    if CACHE_MODE == 'replay':
+        data = _cache_read(url, params)
+        if data is None:
+            raise requests.ConnectionError(f"No cached response for {url} in replay mode")
+        return data
+
+    host = urlparse(url).netloc
+    with metrics.timer('http_request_seconds', host=host):
+        response = get_session().get(url, params=params, timeout=timeout)
+    metrics.observe_response(response, host)
+    if response.status_code in RETRY_STATUSES:
+        raise RetryableHTTPError(
+            f"{response.status_code} from {url}",
+            response=response,
+            retry_after=parse_retry_after(response.headers.get('Retry-After'))
+        )
+    response.raise_for_status()
+    with metrics.timer('http_json_decode_seconds', host=host):
+        data = response.json()
+    if CACHE_MODE in ('record', 'fallback'):
+        _cache_write(url, params, data)
+    return data
+
+
+def _is_retryable(error):
+    return isinstance(error, (RetryableHTTPError, requests.ConnectionError, requests.Timeout))
+
+
+def _fallback(url, params, error):
+    if CACHE_MODE == 'fallback':
+        data = _cache_read(url, params)
+        if data is not None:
+            logging.warning(f"Using cached response for {url} after error: {error}")
+            return data
+    raise error
+
+
+def get_json(url, params=None, max_retries=MAX_RETRIES, timeout=TIMEOUT, backoff=BACKOFF_BASE,
+             budget=RETRY_BUDGET):
+    """GET JSON with retries on connection errors, timeouts, 429 and 5xx, honouring Retry-After."""
+    waited = 0.0
+    for attempt in range(max_retries):
+        try:
+            return request_json(url, params, timeout)
+        except requests.RequestException as e:
+            if not _is_retryable(e) or attempt + 1 == max_retries:
+                return _fallback(url, params, e)
+            delay = _plan_retry(url, attempt, e, backoff, waited, budget)
+            if delay is None:
+                return _fallback(url, params, e)
+            waited += delay
+            time.sleep(delay)
+
+
+async def get_json_async(url, params=None, max_retries=MAX_RETRIES, timeout=TIMEOUT, backoff=BACKOFF_BASE,
+                         budget=RETRY_BUDGET):
+    """Like get_json, but the request runs in a worker thread and backoff never blocks the loop."""
+    waited = 0.0
+    for attempt in range(max_retries):
+        try:
+            return await asyncio.to_thread(request_json, url, params, timeout)
+        except requests.RequestException as e:
+            if not _is_retryable(e) or attempt + 1 == max_retries:
+                return _fallback(url, params, e)
+            delay = _plan_retry(url, attempt, e, backoff, waited, budget)
+            if delay is None:
+                return _fallback(url, params, e)
+            waited += delay
+            await asyncio.sleep(delay)
+
+
+def fetch_all(calls, max_workers=POOL_SIZE, **kwargs):
+    """Fetch independent endpoints concurrently.
+
+    calls maps a name to (url, params). Returns name -> decoded JSON, or
+    name -> None for endpoints that failed after all retries.
+    """
+    def fetch(item):
+        name, (url, params) = item
+        try:
+            return name, get_json(url, params, **kwargs)
+        except (requests.RequestException, ValueError) as e:
+            logging.error(f"Failed to fetch {name}: {e}")
+            return name, None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(calls)))) as executor:
+        return dict(executor.map(fetch, calls.items()))
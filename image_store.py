@@ -0,0 +1,78 @@
+import hashlib
+import mimetypes
+import mmap
+import os
+from contextlib import contextmanager
+
+import metrics
+
+
+class ImageStore:
+    """Serves images from a local directory, falling back to a remote base URL."""
+
+    def __init__(self, directory, names, remote_base=None):
+        self.directory = directory
+        self.names = list(names)
+        self.remote_base = remote_base
+        self.manifest = self.build_manifest()
+
+    def build_manifest(self):
+        """Record size, sha256 and mime type for every image available locally."""
+        manifest = {}
+        for name in self.names:
+            path = os.path.join(self.directory, name)
+            try:
+                size = os.path.getsize(path)
+                if not size:
+                    continue
+                with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    digest = hashlib.sha256(data).hexdigest()
+            except OSError:
+                # Not shipped with this checkout; served from remote_base instead
+                continue
+            manifest[name] = {
+                'path': path,
+                'size': size,
+                'sha256': digest,
+                'mime': mimetypes.guess_type(name)[0] or 'application/octet-stream',
+            }
+        print(f"Image manifest: {len(manifest)}/{len(self.names)} images available locally")
+        return manifest
+
+    def digest(self, name):
+        entry = self.manifest.get(name)
+        return entry['sha256'] if entry else None
+
+    def cache_key(self, name):
+        """Key for uploaded media: the sha256 of a local image, the URL of a remote one."""
+        digest = self.digest(name)
+        if digest:
+            return digest
+        return f"{self.remote_base}/{name}" if self.remote_base else None
+
+    def mime(self, name):
+        entry = self.manifest.get(name)
+        if entry:
+            return entry['mime']
+        return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+    @metrics.timed('image_download_seconds')
+    def download(self, name):
+        """Fetch an image that is missing locally from the remote base URL."""
+        if not self.remote_base:
+            raise FileNotFoundError(f"Image {name} is not available locally and no remote is configured")
+        import requests
+        response = requests.get(f"{self.remote_base}/{name}", timeout=30)
+        response.raise_for_status()
+        print(f"Successfully downloaded image: {name}")
+        return response.content
+
+    @contextmanager
+    def open(self, name):
+        """Yield the image bytes: a read-only memory map locally, downloaded bytes otherwise."""
+        entry = self.manifest.get(name)
+        if entry:
+            with open(entry['path'], 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+        else:
+            yield self.download(name)
@@ -0,0 +1,84 @@
+import json
+import os
+import threading
+import time
+
+MEDIA_CACHE_FILE = 'media_cache.json'
+# Twitter keeps an uploaded media_id usable for 24 hours (expires_after_secs)
+MEDIA_TTL_SECONDS = 24 * 60 * 60
+# Stop reusing a media_id a little before the platform expires it
+EXPIRY_MARGIN_SECONDS = 10 * 60
+
+
+class MediaCache:
+    """Per-account cache of uploaded media IDs keyed by image content hash, or URL for remote-only images."""
+
+    def __init__(self, path=MEDIA_CACHE_FILE, ttl=MEDIA_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.entries = self.load()
+        self.dirty = False
+
+    def load(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as file:
+                    return json.load(file)
+        except Exception as e:
+            print(f"Error loading media cache: {e}")
+        return {}
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if not self.dirty:
+            return
+        try:
+            self.prune()
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as file:
+                json.dump(self.entries, file, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            print(f"Error saving media cache: {e}")
+
+    def get(self, account_key, digest):
+        """Return a still-valid media ID for this account and content, or None."""
+        with self.lock:
+            entry = self.entries.get(account_key, {}).get(digest)
+            if entry and entry['expires_at'] - EXPIRY_MARGIN_SECONDS > time.time():
+                self.hits += 1
+                return entry['media_id']
+            self.misses += 1
+            return None
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def put(self, account_key, digest, media_id, expires_after=None):
+        """Remember an uploaded media ID, honouring the server-reported lifetime."""
+        ttl = expires_after if expires_after else self.ttl
+        with self.lock:
+            self.entries.setdefault(account_key, {})[digest] = {
+                'media_id': media_id,
+                'expires_at': time.time() + ttl,
+            }
+            self.dirty = True
+
+    def prune(self):
+        now = time.time()
+        for account_key in list(self.entries):
+            account_entries = self.entries[account_key]
+            for digest in [d for d, e in account_entries.items() if e['expires_at'] <= now]:
+                del account_entries[digest]
+                self.dirty = True
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,219 @@
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from urllib.parse import urlparse
+
+# Metrics are off unless one of these is set; disabled calls return immediately
+METRICS_FILE = os.environ.get('METRICS_FILE')  # Prometheus text file, rewritten on flush
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '0'))  # serve /metrics on this port
+METRICS_LOG = os.environ.get('METRICS_LOG')  # JSON lines, one per timing; '-' for stderr
+ENABLED = bool(METRICS_FILE or METRICS_PORT or METRICS_LOG or os.environ.get('METRICS') in ('1', 'true'))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_json_log = None
+_NULL_TIMER = nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _log_event(event):
+    global _json_log
+    if not METRICS_LOG:
+        return
+    if _json_log is None:
+        _json_log = logging.getLogger('metrics.events')
+        _json_log.propagate = False
+        handler = logging.StreamHandler(sys.stderr) if METRICS_LOG == '-' else logging.FileHandler(METRICS_LOG)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _json_log.addHandler(handler)
+        _json_log.setLevel(logging.INFO)
+    _json_log.info(json.dumps(event, default=str))
+
+
+def inc(name, value=1, **labels):
+    """Add value to a counter."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Record one duration in a histogram."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['count'] += 1
+        histogram['sum'] += seconds
+
+
+@contextmanager
+def _timer(name, labels):
+    started = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        observe(name, seconds, **labels)
+        if outcome == 'error':
+            inc(f"{name.rsplit('_seconds', 1)[0]}_errors_total", **labels)
+        _log_event({'ts': time.time(), 'metric': name, 'seconds': round(seconds, 6), 'outcome': outcome, **labels})
+
+
+def timer(name, **labels):
+    """Context manager timing its block into histogram name; a shared no-op when disabled."""
+    if not ENABLED:
+        return _NULL_TIMER
+    return _timer(name, labels)
+
+
+def timed(name, **labels):
+    """Decorator form of timer(); leaves the function untouched when metrics are disabled."""
+    def decorate(func):
+        if not ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _timer(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_response(response, endpoint):
+    """Record time to response headers for a requests.Response, split from the caller's total."""
+    if not ENABLED or response is None:
+        return
+    observe('http_response_seconds', response.elapsed.total_seconds(),
+            endpoint=endpoint, status=response.status_code)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render_prometheus():
+    """Return every metric in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: {**h, 'buckets': list(h['buckets'])} for key, h in _histograms.items()}
+
+    lines = []
+    typed = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram['buckets']):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labels, [('le', str(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def flush(path=None):
+    """Atomically rewrite the Prometheus text file, if one is configured."""
+    path = path or METRICS_FILE
+    if not ENABLED or not path:
+        return
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Failed to write metrics to {path}: {e}")
+
+
+def serve(port=METRICS_PORT):
+    """Expose /metrics over HTTP from a daemon thread; returns the server, or None if disabled."""
+    if not ENABLED or not port:
+        return None
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if urlparse(self.path).path != '/metrics':
+                self.send_error(404)
+                return
+            body = render_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def instrument_connections():
+    """Time new urllib3 connections (DNS, TCP and TLS handshake) for requests-based clients."""
+    if not ENABLED:
+        return
+    try:
+        from urllib3.connection import HTTPConnection, HTTPSConnection
+    except ImportError:
+        return
+    for cls, scheme in ((HTTPConnection, 'http'), (HTTPSConnection, 'https')):
+        connect = cls.__dict__.get('connect')
+        if connect is None or getattr(connect, '_metrics', False):
+            continue
+
+        def timed_connect(self, _connect=connect, _scheme=scheme):
+            with _timer('http_connect_seconds', {'scheme': _scheme, 'host': self.host}):
+                return _connect(self)
+        timed_connect._metrics = True
+        cls.connect = timed_connect
+
+
+if ENABLED:
+    instrument_connections()
+    atexit.register(flush)
@@ -2,28 +2,60 @@ import requests
 import json
 import os
 import logging
+import hashlib
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import sys
 
+# Shared modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+import metrics
+from watchlist import fetch_price_table, format_number
+from templates import CONTENT_LIMIT, compile_template, tweet_length
+from similarity import SimilarityIndex, SIMILARITY_THRESHOLD, index_path
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# CoinGecko API URLs
-CRYPTO_API_URL = "https://api.coingecko.com/api/v3/simple/price?ids=bitcoin,ethereum&vs_currencies=usd&include_market_cap=true&include_24hr_vol=true&include_24hr_change=true"
+# CoinGecko API URLs; prices come from watchlist.fetch_price_table
 TRENDING_API_URL = "https://api.coingecko.com/api/v3/search/trending"
 
 # File paths
 POSTS_FILE = 'post/post.json'
 MD_FILE = 'post/data.md'  # Adjusted to save markdown file as .md
+CACHE_DIR = os.environ.get('CACHE_DIR', '.cache')
+POSTS_SECTION_CACHE = os.path.join(CACHE_DIR, 'posts_section.md')
+WRITE_BUFFER_SIZE = 1 << 16
+
+# Declarative per-post patches applied on every run, keyed by post ID
+# Giveaway post text; compiled against the tweet limit, so an edit that makes it too long fails here
+GIVEAWAY_TEMPLATE = compile_template(
+    "🚀 SOLANA GIVEAWAY 🚀\n\n🎁 Win {amount} $SOL (~${usd})\n\n🤝 Follow {hosts}\n❤️ RT & Like\n"
+    "💬 Comment your wallet\n\n⏳ {hours} hrs! #SolanaGiveaway #Crypto",
+    limit=CONTENT_LIMIT, length=tweet_length, amount=8, usd=10, hosts=80, hours=3
+)
+GIVEAWAY = {"amount": "2.6", "usd": "1300", "hosts": "@likhon_decrypto & @fariacrypto", "hours": 48}
+
+POST_OVERRIDES = {
+    1: {
+        "content": GIVEAWAY_TEMPLATE.render(GIVEAWAY),
+    },
+}
 
 def load_json(file_path):
+    """Return the raw text of a JSON file and its decoded value."""
     try:
         if not os.path.exists(file_path):
             logging.error(f"File does not exist: {file_path}")
             sys.exit(1)
 
         with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+            text = f.read()
+        return text, json.loads(text)
     except json.JSONDecodeError as e:
         logging.error(f"Failed to decode JSON: {e}")
         sys.exit(1)
@@ -31,91 +63,211 @@ def load_json(file_path):
         logging.error(f"Failed to load JSON file: {e}")
         sys.exit(1)
 
-def save_json(data, file_path):
-    try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
-        logging.info(f"JSON data saved to {file_path}")
-    except Exception as e:
-        logging.error(f"Failed to save JSON file: {e}")
+def validate_posts(data):
+    """Exit if any entry cannot be posted, so post.json is never rewritten without it; clear non-integer IDs."""
+    invalid = 0
+    for index, post in enumerate(data.get("posts", [])):
+        if not isinstance(post, dict) or not isinstance(post.get("content"), str) or not post["content"].strip():
+            logging.error(f"Invalid post at index {index}: {post!r:.80}")
+            invalid += 1
+            continue
+        if not isinstance(post.get("id"), int) or isinstance(post.get("id"), bool):
+            logging.warning(f"Post at index {index} has invalid ID {post.get('id')!r}; a new ID will be assigned")
+            post["id"] = None
+    if invalid:
+        logging.error(f"{invalid} invalid posts in the catalogue; fix them before running again")
         sys.exit(1)
+    return data
 
 def fix_duplicate_ids(data):
-    unique_id = 1
+    """Give duplicate or missing IDs fresh values above the current maximum, so they never collide."""
+    posts = data.get("posts", [])
+    next_id = max((post["id"] for post in posts if post.get("id") is not None), default=0) + 1
     seen_ids = set()
-    for post in data.get("posts", []):
-        if post["id"] in seen_ids:
-            logging.info(f"Duplicate ID {post['id']} found. Assigning new ID: {unique_id}")
-            post["id"] = unique_id
-            unique_id += 1
+    for post in posts:
+        if post.get("id") is None or post["id"] in seen_ids:
+            logging.info(f"Duplicate ID {post.get('id')} found. Assigning new ID: {next_id}")
+            post["id"] = next_id
+            next_id += 1
         seen_ids.add(post["id"])
     logging.info("Duplicate IDs fixed")
     return data
 
+def apply_overrides(data, overrides=POST_OVERRIDES):
+    for post in data.get("posts", []):
+        patch = overrides.get(post["id"])
+        if patch:
+            post.update(patch)
+    return data
+
+def write_if_changed(text, original, file_path):
+    """Write text to file_path via a temp file and rename, but only if it differs from original."""
+    if text == original:
+        logging.info(f"No changes to {file_path}")
+        return False
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    logging.info(f"JSON data saved to {file_path}")
+    return True
+
+def run_catalogue_pipeline(file_path):
+    """Load, validate, dedupe and patch post.json in one pass, writing it at most once.
+
+    Returns the catalogue and the sha256 of its serialized form.
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    def stage(name):
+        nonlocal started
+        now = time.perf_counter()
+        timings[name] = now - started
+        metrics.observe('update_data_stage_seconds', now - started, stage=name)
+        started = now
+
+    original, data = load_json(file_path)
+    stage("load")
+
+    validate_posts(data)
+    stage("validate")
+    fix_duplicate_ids(data)
+    stage("dedupe")
+    apply_overrides(data)
+    stage("patch")
+
+    text = json.dumps(data, indent=4, ensure_ascii=False)
+    stage("serialize")
+    try:
+        write_if_changed(text, original, file_path)
+    except Exception as e:
+        logging.error(f"Failed to save JSON file: {e}")
+        sys.exit(1)
+    stage("write")
+
+    update_similarity_index(data, index_path(file_path))
+    stage("index")
+
+    logging.info("Catalogue pipeline: " + ", ".join(f"{name} {secs * 1000:.1f}ms" for name, secs in timings.items()))
+    return data, hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def update_similarity_index(data, index_file):
+    """Refresh the MinHash index stored next to post.json and report near-duplicate posts."""
+    try:
+        index = SimilarityIndex.load(index_file)
+        index.refresh(data.get("posts", []))
+        if index.dirty:
+            index.save(index_file)
+            logging.info(f"Similarity index saved to {index_file}")
+    except Exception as e:
+        logging.error(f"Failed to update similarity index: {e}")
+        return
+    pairs = index.near_duplicates(SIMILARITY_THRESHOLD)
+    if pairs:
+        logging.info(f"{len(pairs)} near-duplicate post pairs in the catalogue, e.g. "
+                     + ", ".join(f"{a}~{b}" for a, b, _ in sorted(pairs)[:5]))
+
 def fetch_crypto_data():
+    """Fetch prices for every coin on the watchlist as a PriceTable."""
     try:
-        response = requests.get(CRYPTO_API_URL)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        with metrics.timer('update_data_fetch_seconds', source='prices'):
+            return fetch_price_table()
+    except Exception as e:
         logging.error(f"Failed to fetch cryptocurrency data: {e}")
         return None
 
 def fetch_trending_data():
     try:
-        response = requests.get(TRENDING_API_URL)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
+        with metrics.timer('update_data_fetch_seconds', source='trending'):
+            return http_client.get_json(TRENDING_API_URL)
+    except (requests.RequestException, ValueError) as e:
         logging.error(f"Failed to fetch trending data: {e}")
         return None
 
-def create_markdown(crypto_data, trending_data, posts):
-    markdown_content = "# Cryptocurrency Data\n\n"
-    markdown_content += f"**Last updated:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n\n"
-
-    markdown_content += "## Live Prices\n"
-    if crypto_data:
-        bitcoin = crypto_data.get("bitcoin", {})
-        ethereum = crypto_data.get("ethereum", {})
-
-        markdown_content += f"- **Bitcoin (BTC)**: ${bitcoin.get('usd', 'N/A')} USD\n"
-        markdown_content += f"  - Market Cap: ${bitcoin.get('usd_market_cap', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Volume: ${bitcoin.get('usd_24h_vol', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Change: {bitcoin.get('usd_24h_change', 'N/A')}%\n\n"
+def fetch_market_data():
+    """Fetch watchlist prices and trending coins concurrently over the shared session."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        prices = executor.submit(fetch_crypto_data)
+        trending = executor.submit(fetch_trending_data)
+        return prices.result(), trending.result()
 
-        markdown_content += f"- **Ethereum (ETH)**: ${ethereum.get('usd', 'N/A')} USD\n"
-        markdown_content += f"  - Market Cap: ${ethereum.get('usd_market_cap', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Volume: ${ethereum.get('usd_24h_vol', 'N/A')} USD\n"
-        markdown_content += f"  - 24h Change: {ethereum.get('usd_24h_change', 'N/A')}%\n\n"
+def write_prices_section(out, price_table):
+    out.write("## Live Prices\n")
+    if price_table:
+        for coin in price_table:
+            out.write(f"- **{coin.name} ({coin.symbol})**: ${format_number(coin.price)} USD\n")
+            out.write(f"  - Market Cap: ${format_number(coin.market_cap)} USD\n")
+            out.write(f"  - 24h Volume: ${format_number(coin.volume)} USD\n")
+            out.write(f"  - 24h Change: {format_number(coin.change_24h)}%\n\n")
     else:
-        markdown_content += "No live cryptocurrency data available.\n\n"
+        out.write("No live cryptocurrency data available.\n\n")
 
-    markdown_content += "## Trending Coins\n"
+def write_trending_section(out, trending_data):
+    out.write("## Trending Coins\n")
     if trending_data and trending_data.get("coins"):
         for coin in trending_data["coins"]:
             item = coin["item"]
-            markdown_content += f"- **{item['name']} ({item['symbol'].upper()})**\n"
-            markdown_content += f"  - Market Cap Rank: {item['market_cap_rank']}\n"
-            markdown_content += f"  - Price (BTC): {item['price_btc']}\n"
-            markdown_content += f"  - [More Info](https://www.coingecko.com/en/coins/{item['slug']})\n\n"
+            out.write(f"- **{item['name']} ({item['symbol'].upper()})**\n")
+            out.write(f"  - Market Cap Rank: {item['market_cap_rank']}\n")
+            out.write(f"  - Price (BTC): {item['price_btc']}\n")
+            out.write(f"  - [More Info](https://www.coingecko.com/en/coins/{item['slug']})\n\n")
     else:
-        markdown_content += "No trending coins available.\n\n"
+        out.write("No trending coins available.\n\n")
 
-    markdown_content += "## Posts\n"
+def write_posts_section(out, posts):
+    out.write("## Posts\n")
     for post in posts:
-        markdown_content += f"- **Post ID: {post['id']}**\n"
-        markdown_content += f"  - Content:\n```\n{post['content']}\n```\n\n"
+        out.write(f"- **Post ID: {post['id']}**\n")
+        out.write(f"  - Content:\n```\n{post['content']}\n```\n\n")
+
+def cached_posts_section(posts, posts_hash):
+    """Return the path of the rendered posts section, re-rendering only when post.json changed."""
+    key_path = f"{POSTS_SECTION_CACHE}.key"
+    try:
+        with open(key_path, 'r') as f:
+            if f.read().strip() == posts_hash and os.path.exists(POSTS_SECTION_CACHE):
+                logging.info("Posts unchanged, reusing rendered posts section")
+                return POSTS_SECTION_CACHE
+    except OSError:
+        pass
 
-    return markdown_content
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = f"{POSTS_SECTION_CACHE}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as out:
+        write_posts_section(out, posts)
+    os.replace(tmp_path, POSTS_SECTION_CACHE)
+    with open(key_path, 'w') as f:
+        f.write(posts_hash)
+    logging.info(f"Rendered posts section for {len(posts)} posts")
+    return POSTS_SECTION_CACHE
 
-def save_markdown(content, file_path=MD_FILE):
+def write_markdown(price_table, trending_data, posts, posts_hash, file_path=MD_FILE):
+    """Stream the report into a temp file next to file_path and atomically rename it into place."""
+    tmp_path = None
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
+        section_path = cached_posts_section(posts, posts_hash)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path) or '.', suffix='.tmp')
+        with open(fd, 'w', encoding='utf-8', buffering=WRITE_BUFFER_SIZE) as out:
+            out.write("# Cryptocurrency Data\n\n")
+            out.write(f"**Last updated:** {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC\n\n")
+            write_prices_section(out, price_table)
+            write_trending_section(out, trending_data)
+            out.flush()
+            with open(section_path, 'r', encoding='utf-8') as section:
+                shutil.copyfileobj(section, out, WRITE_BUFFER_SIZE)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
         logging.info(f"Markdown data saved to {file_path}")
     except Exception as e:
         logging.error(f"Failed to save markdown file: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
 
 def main():
     input_file = POSTS_FILE
@@ -124,28 +276,15 @@ def main():
     abs_path = os.path.abspath(input_file)
     logging.info(f"Using file: {abs_path}")
 
-    data = load_json(input_file)
-    data = fix_duplicate_ids(data)
-    save_json(data, input_file)
+    data, posts_hash = run_catalogue_pipeline(input_file)
 
     # Fetch cryptocurrency data and trending coins
-    crypto_data = fetch_crypto_data()
-    trending_data = fetch_trending_data()
+    price_table, trending_data = fetch_market_data()
     posts = data.get("posts", [])  # Ensure posts are extracted from the data dictionary
 
-    # Update post with cryptocurrency data
-    for post in posts:
-        if post["id"] == 1:
-            post["content"] = "🚀 SOLANA GIVEAWAY 🚀\n\n🎁 Win 2.6 $SOL (~$1300)\n\n🤝 Follow @likhon_decrypto & @fariacrypto\n❤️ RT & Like\n💬 Comment your wallet\n\n⏳ 48 hrs! #SolanaGiveaway #Crypto"
-
-    # Save updated posts
-    save_json(data, input_file)
-
-    # Create markdown content
-    markdown_content = create_markdown(crypto_data, trending_data, posts)
-
-    # Save markdown content to data.md
-    save_markdown(markdown_content)
+    # Write data.md, re-rendering the posts section only if post.json changed
+    write_markdown(price_table, trending_data, posts, posts_hash)
+    metrics.flush()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,337 @@
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import metrics
+
+QUEUE_WORKERS = int(os.environ.get('QUEUE_WORKERS', '4'))
+QUEUE_MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', '8'))
+QUEUE_BACKOFF_BASE = float(os.environ.get('QUEUE_BACKOFF_BASE', '30'))
+QUEUE_BACKOFF_CAP = float(os.environ.get('QUEUE_BACKOFF_CAP', '3600'))
+# A claimed job whose worker has not finished within this many seconds is assumed crashed
+QUEUE_LEASE_SECONDS = float(os.environ.get('QUEUE_LEASE_SECONDS', '600'))
+POLL_INTERVAL = 5.0
+
+# Job states:
+#   pending   - waiting to be posted
+#   running   - claimed; media upload in progress, nothing sent yet
+#   sending   - the tweet request is out; the outcome is unknown until it returns
+#   verify    - interrupted while sending; check the timeline before posting again
+#   verifying - claimed for verification
+#   done / failed
+CLAIMED_STATES = ('running', 'sending', 'verifying')
+
+Job = namedtuple('Job', 'id key account post_id content text state attempts run_at started_at')
+JOB_COLUMNS = 'id, key, account, post_id, content, text, state, attempts, run_at, started_at'
+
+
+class RetryLater(Exception):
+    """Transient failure; the job is retried after retry_after seconds, or with backoff."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimited(RetryLater):
+    """The account hit its rate limit; none of its jobs are claimed before reset_at."""
+
+    def __init__(self, message, reset_at):
+        super().__init__(message, max(0.0, reset_at - time.time()))
+        self.reset_at = reset_at
+
+
+class PermanentFailure(Exception):
+    """The platform rejected the post; retrying would not help."""
+
+
+class PostQueue:
+    """Durable queue of planned posts, stored next to the post history.
+
+    Jobs live in the history store's SQLite database so that completing a
+    job and recording it in the history happen in one transaction.
+    """
+
+    def __init__(self, history, max_attempts=QUEUE_MAX_ATTEMPTS, backoff_base=QUEUE_BACKOFF_BASE,
+                 backoff_cap=QUEUE_BACKOFF_CAP, lease=QUEUE_LEASE_SECONDS):
+        self.history = history
+        self.conn = history.conn
+        self.lock = history.lock
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.lease = lease
+        with self.lock, self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT NOT NULL UNIQUE,
+                    account TEXT NOT NULL,
+                    post_id TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    text TEXT,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    run_at REAL NOT NULL,
+                    started_at REAL,
+                    lease_until REAL,
+                    tweet_id TEXT,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS jobs_state_due ON jobs (state, run_at);
+                CREATE INDEX IF NOT EXISTS jobs_account_state ON jobs (account, state);
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    account TEXT PRIMARY KEY,
+                    reset_at REAL NOT NULL
+                );
+            """)
+        self.prune()
+
+    def prune(self):
+        """Delete finished jobs older than the history retention period."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM jobs WHERE state IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.history.retention,)
+            )
+
+    def enqueue(self, account, post_id, content, key, run_at=None):
+        """Plan a post; returns the job ID, or None if a job with this idempotency key exists."""
+        now = time.time()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO jobs (key, account, post_id, content, state, run_at, created_at, updated_at) '
+                "VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)",
+                (key, account, str(post_id), content, run_at or now, now, now)
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def has_open_job(self, account):
+        """Return True if the account has a job that is not yet done or failed."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM jobs WHERE account = ? AND state NOT IN ('done', 'failed') LIMIT 1",
+                (account,)
+            ).fetchone()
+        return row is not None
+
+    def state(self, job_id):
+        with self.lock:
+            row = self.conn.execute('SELECT state FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _expire_leases(self, now):
+        """Return jobs abandoned by a crashed worker: unsent ones to pending, possibly sent ones to verify."""
+        return self.conn.execute(
+            "UPDATE jobs SET state = CASE state WHEN 'running' THEN 'pending' ELSE 'verify' END, "
+            "lease_until = NULL, updated_at = ? "
+            "WHERE state IN ('running', 'sending', 'verifying') AND lease_until < ?",
+            (now, now)
+        ).rowcount
+
+    def recover(self, now=None):
+        """Release in-flight jobs whose lease expired; returns how many were recovered."""
+        with self.lock, self.conn:
+            return self._expire_leases(now or time.time())
+
+    def claim(self, now=None):
+        """Claim the next due job whose account is neither busy nor rate limited, or return None."""
+        now = now or time.time()
+        with self.lock, self.conn:
+            self._expire_leases(now)
+            row = self.conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs "
+                "WHERE state IN ('pending', 'verify') AND run_at <= ? "
+                "AND account NOT IN (SELECT account FROM jobs WHERE state IN ('running', 'sending', 'verifying')) "
+                "AND account NOT IN (SELECT account FROM rate_limits WHERE reset_at > ?) "
+                "ORDER BY run_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job = Job(*row)
+            state = 'running' if job.state == 'pending' else 'verifying'
+            claimed = self.conn.execute(
+                'UPDATE jobs SET state = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? '
+                'WHERE id = ? AND state = ?',
+                (state, now + self.lease, now, job.id, job.state)
+            ).rowcount
+        # Another process claimed it between our SELECT and UPDATE
+        if not claimed:
+            return None
+        return job._replace(state=state, attempts=job.attempts + 1)
+
+    def mark_sending(self, job, text):
+        """Record the exact text about to be posted; from here a crash means the outcome is unknown."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'sending', text = ?, started_at = ?, lease_until = ?, updated_at = ? "
+                'WHERE id = ?',
+                (text, now, now + self.lease, now, job.id)
+            )
+        return job._replace(state='sending', text=text, started_at=now)
+
+    def complete(self, job, tweet_id, posted_at=None):
+        """Mark the job done and append it to the post history in the same transaction."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'done', tweet_id = ?, lease_until = NULL, last_error = NULL, "
+                'updated_at = ? WHERE id = ?',
+                (tweet_id, now, job.id)
+            )
+            self.history.insert(job.account, job.post_id, posted_at or now)
+
+    def backoff(self, attempts):
+        """Exponential backoff with jitter for the given attempt count."""
+        delay = min(self.backoff_cap, self.backoff_base * 2 ** max(0, attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def retry(self, job, error, retry_after=None, sent=None):
+        """Schedule another attempt, or fail the job once it has used all its attempts.
+
+        A job that was already sending goes to verify so it is never posted twice;
+        pass sent=False when the platform confirmed nothing was posted.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            current = self.conn.execute('SELECT state FROM jobs WHERE id = ?', (job.id,)).fetchone()
+            unknown = current is not None and current[0] in ('sending', 'verifying')
+            if sent is False:
+                unknown = current is not None and current[0] == 'verifying'
+            if job.attempts >= self.max_attempts:
+                self.conn.execute(
+                    "UPDATE jobs SET state = 'failed', lease_until = NULL, last_error = ?, updated_at = ? "
+                    'WHERE id = ?',
+                    (str(error), now, job.id)
+                )
+                return None
+            run_at = now + (retry_after if retry_after is not None else self.backoff(job.attempts))
+            self.conn.execute(
+                'UPDATE jobs SET state = ?, run_at = ?, lease_until = NULL, last_error = ?, updated_at = ? '
+                'WHERE id = ?',
+                ('verify' if unknown else 'pending', run_at, str(error), now, job.id)
+            )
+        return run_at
+
+    def fail(self, job, error):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = 'failed', lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                (str(error), now, job.id)
+            )
+
+    def rate_limit(self, account, reset_at):
+        """Hold every job of the account until reset_at."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT INTO rate_limits VALUES (?, ?) '
+                'ON CONFLICT(account) DO UPDATE SET reset_at = MAX(reset_at, excluded.reset_at)',
+                (account, reset_at)
+            )
+
+    def next_due(self):
+        """Epoch time the earliest waiting job may run, honouring rate limits, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT MIN(MAX(j.run_at, COALESCE(r.reset_at, 0))) FROM jobs j '
+                'LEFT JOIN rate_limits r ON r.account = j.account '
+                "WHERE j.state IN ('pending', 'verify')"
+            ).fetchone()
+        return row[0]
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+
+class QueueWorkers:
+    """Worker threads that drain a PostQueue through handler(job).
+
+    The handler posts the job and completes it; it raises RetryLater,
+    RateLimited or PermanentFailure to steer what happens next. Any other
+    exception is retried with backoff.
+    """
+
+    def __init__(self, queue, handler, workers=QUEUE_WORKERS, poll_interval=POLL_INTERVAL):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.threads = []
+
+    def process(self, job):
+        try:
+            self.handler(job)
+            metrics.inc('queue_jobs_total', outcome='done')
+        except RateLimited as e:
+            self.queue.rate_limit(job.account, e.reset_at)
+            self.queue.retry(job, e, retry_after=e.retry_after, sent=False)
+            print(f"{job.account} is rate limited; job {job.key} waits until {time.ctime(e.reset_at)}")
+            metrics.inc('queue_jobs_total', outcome='rate_limited')
+        except PermanentFailure as e:
+            self.queue.fail(job, e)
+            print(f"Job {job.key} failed permanently: {e}")
+            metrics.inc('queue_jobs_total', outcome='failed')
+        except Exception as e:
+            retry_after = e.retry_after if isinstance(e, RetryLater) else None
+            run_at = self.queue.retry(job, e, retry_after=retry_after)
+            if run_at is None:
+                print(f"Job {job.key} failed after {job.attempts} attempts: {e}")
+                metrics.inc('queue_jobs_total', outcome='failed')
+            else:
+                print(f"Job {job.key} attempt {job.attempts} failed: {e}; retrying in {run_at - time.time():.0f}s")
+                metrics.inc('queue_jobs_total', outcome='retry')
+        finally:
+            self.wake()
+
+    def _loop(self, deadline=None):
+        """Work until stopped or, with a deadline, until nothing is due before it."""
+        while not self.stopping:
+            # Past the deadline, finish the job in hand but claim no more
+            if deadline is not None and time.time() >= deadline:
+                return
+            job = self.queue.claim()
+            if job:
+                self.process(job)
+                continue
+            now = time.time()
+            due = self.queue.next_due()
+            if deadline is not None and (due is None or due > deadline or now >= deadline):
+                return
+            wait = self.poll_interval if due is None else min(self.poll_interval, max(0.1, due - now))
+            with self.condition:
+                self.condition.wait(wait)
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def run_until_idle(self, timeout):
+        """Drain due jobs for at most timeout seconds; anything left stays queued."""
+        deadline = time.time() + timeout
+        threads = [threading.Thread(target=self._loop, args=(deadline,)) for _ in range(max(1, self.workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start(self):
+        """Run workers in the background until stop()."""
+        self.threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(max(1, self.workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopping = True
+        self.wake()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,125 @@
+import heapq
+import random
+import threading
+import time
+
+DEFAULT_COOLDOWN_SECONDS = 24 * 60 * 60
+# Weights are stored as integers so the tree sums stay exact
+WEIGHT_SCALE = 1000
+
+
+class WeightTree:
+    """Fenwick tree over integer weights supporting O(log n) update and weighted sampling."""
+
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.values = list(weights)
+        self.tree = [0] * (self.n + 1)
+        for i in range(1, self.n + 1):
+            self.tree[i] += self.values[i - 1]
+            parent = i + (i & -i)
+            if parent <= self.n:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.values)
+        self.top_step = 1 << (self.n.bit_length() - 1) if self.n else 0
+
+    def set(self, index, weight):
+        delta = weight - self.values[index]
+        if not delta:
+            return
+        self.values[index] = weight
+        self.total += delta
+        i = index + 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Return the index whose cumulative weight range contains target."""
+        pos = 0
+        step = self.top_step
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= target:
+                pos = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        return pos
+
+
+class AccountState:
+    def __init__(self, weights):
+        self.tree = WeightTree(weights)
+        # (next_eligible_time, index) for posts that are cooling down
+        self.cooling = []
+        # Latest next-eligible time per index, so stale heap entries are skipped
+        self.until = {}
+
+
+class PostSelector:
+    """Picks the next post per account from a cooldown heap and a weighted eligible set.
+
+    Posts may set an optional "weight" (default 1) and "cooldown_hours"
+    (default 24) in post.json.
+    """
+
+    def __init__(self, posts, history=None, default_cooldown=DEFAULT_COOLDOWN_SECONDS):
+        self.posts = list(posts)
+        self.history = history
+        # The catalogue may repeat an ID; every entry sharing it cools down together
+        self.index = {}
+        for i, p in enumerate(self.posts):
+            self.index.setdefault(str(p['id']), []).append(i)
+        self.weights = [max(0, int(round(p.get('weight', 1) * WEIGHT_SCALE))) for p in self.posts]
+        self.cooldowns = [
+            p['cooldown_hours'] * 3600 if p.get('cooldown_hours') is not None else default_cooldown
+            for p in self.posts
+        ]
+        self.max_cooldown = max(self.cooldowns, default=default_cooldown)
+        self.accounts = {}
+        self.lock = threading.Lock()
+
+    def _state(self, account, now):
+        state = self.accounts.get(account)
+        if state is None:
+            state = AccountState(self.weights)
+            if self.history is not None:
+                for post_id, posted_at in self.history.last_posted_times(account, now - self.max_cooldown).items():
+                    for i in self.index.get(post_id, ()):
+                        if posted_at + self.cooldowns[i] > now:
+                            state.tree.set(i, 0)
+                            state.until[i] = posted_at + self.cooldowns[i]
+                            state.cooling.append((state.until[i], i))
+                heapq.heapify(state.cooling)
+            self.accounts[account] = state
+        return state
+
+    def _release(self, state, now):
+        while state.cooling and state.cooling[0][0] <= now:
+            until, i = heapq.heappop(state.cooling)
+            if state.until.get(i) == until:
+                del state.until[i]
+                state.tree.set(i, self.weights[i])
+
+    def pick(self, account, now=None):
+        """Return a weighted-random eligible post for the account, or None."""
+        now = now or time.time()
+        with self.lock:
+            state = self._state(account, now)
+            self._release(state, now)
+            if state.tree.total <= 0:
+                return None
+            return self.posts[state.tree.find(random.randrange(state.tree.total))]
+
+    def mark_posted(self, account, post_id, now=None):
+        """Put a post into cooldown for the account."""
+        now = now or time.time()
+        indices = self.index.get(str(post_id))
+        if not indices:
+            return
+        with self.lock:
+            state = self._state(account, now)
+            for i in indices:
+                state.tree.set(i, 0)
+                state.until[i] = now + self.cooldowns[i]
+                heapq.heappush(state.cooling, (state.until[i], i))
@@ -0,0 +1,242 @@
+import hashlib
+import os
+import random
+import re
+
+# MinHash signature length, split into LSH bands of NUM_PERM // BANDS rows.
+# 16 bands of 4 rows make posts above roughly 50% Jaccard similarity share a band.
+NUM_PERM = 64
+BANDS = 16
+# Character shingles of the normalized text
+SHINGLE_SIZE = 5
+SEED = 1
+SIMILARITY_THRESHOLD = float(os.environ.get('SIMILARITY_THRESHOLD', '0.8'))
+INDEX_VERSION = 1
+# Multiplier of the rolling shingle hash
+SHINGLE_BASE = 1000003
+# Shingle hashes permuted per numpy pass while building signatures
+HASH_CHUNK = 1 << 16
+
+_URL = re.compile(r'https?://\S+')
+_HANDLE = re.compile(r'@\w+')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(text):
+    """Lowercase text and mask links, @handles and numbers, so posts differing only in those match."""
+    text = _URL.sub(' url ', text.lower())
+    text = _HANDLE.sub('@', text)
+    text = _NUMBER.sub('0', text)
+    return _SPACE.sub(' ', text).strip()
+
+
+def index_path(catalogue_path):
+    """Where the index for a catalogue file lives: post/post.json -> post/post.minhash.npz."""
+    return os.path.splitext(catalogue_path)[0] + '.minhash.npz'
+
+
+def content_digest(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class SimilarityIndex:
+    """MinHash signatures and LSH band keys for every post in the catalogue.
+
+    Signatures are computed once per post and saved next to the catalogue;
+    later refreshes hash only new or edited posts. Candidates must share a
+    band key before their signatures are compared, so neither lookups nor
+    the catalogue-wide duplicate report compare posts pairwise.
+    """
+
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE, seed=SEED):
+        import numpy as np
+
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = random.Random(seed)
+        # Multiply-shift hash family: the high 32 bits of a * x + b, with a odd
+        self.a = np.array([rng.getrandbits(64) | 1 for _ in range(num_perm)], dtype=np.uint64)
+        self.b = np.array([rng.getrandbits(64) for _ in range(num_perm)], dtype=np.uint64)
+        # Row i describes the catalogue entry ids[i]; an ID repeated in the catalogue has several rows
+        self.ids = []
+        self.rows = {}
+        self.digests = np.zeros(0, dtype=np.uint64)
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self.band_keys = np.zeros((0, bands), dtype=np.uint64)
+        self.dirty = False
+
+    def params(self):
+        return [INDEX_VERSION, self.num_perm, self.bands, self.shingle_size, self.seed]
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a saved index; a missing or unreadable file, or one built with other parameters, starts empty."""
+        import numpy as np
+
+        index = cls(**kwargs)
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if saved['params'].tolist() != index.params():
+                    index.dirty = True
+                    return index
+                index._set(saved['ids'].tolist(), saved['digests'], saved['signatures'])
+        except FileNotFoundError:
+            index.dirty = True
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error loading similarity index from {path}: {e}")
+            index.dirty = True
+        return index
+
+    def save(self, path):
+        """Write the index via a temp file and rename."""
+        import numpy as np
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, params=np.array(self.params()), ids=np.array(self.ids, dtype=str),
+                     digests=self.digests, signatures=self.signatures)
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    def _set(self, ids, digests, signatures):
+        import numpy as np
+
+        self.ids = list(ids)
+        self.rows = {}
+        for row, post_id in enumerate(self.ids):
+            self.rows.setdefault(post_id, []).append(row)
+        self.digests = np.asarray(digests, dtype=np.uint64)
+        self.signatures = np.asarray(signatures, dtype=np.uint32).reshape(len(self.ids), self.num_perm)
+        # One 64-bit key per band: a multiplicative hash of the band's rows
+        rows = self.signatures.reshape(len(self.ids), self.bands, -1).astype(np.uint64)
+        weights = np.array([0x9E3779B97F4A7C15 ** (i + 1) % (1 << 64) for i in range(rows.shape[2])],
+                           dtype=np.uint64)
+        self.band_keys = (rows * weights).sum(axis=2, dtype=np.uint64)
+
+    def compute(self, texts):
+        """MinHash signatures for texts, one row each.
+
+        The shingles of every text are hashed together as a rolling polynomial
+        over their code points, then permuted in vectorised chunks.
+        """
+        import numpy as np
+
+        size = self.shingle_size
+        texts = [normalize(text).ljust(size) for text in texts]
+        result = np.zeros((len(texts), self.num_perm), dtype=np.uint32)
+        if not texts:
+            return result
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        codes = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        windows = len(codes) - size + 1
+        hashes = np.zeros(windows, dtype=np.uint64)
+        for offset in range(size):
+            hashes = hashes * np.uint64(SHINGLE_BASE) + codes[offset:offset + windows]
+        # Keep only the shingles that lie within a single text
+        ends = np.cumsum(lengths)
+        owner = np.repeat(np.arange(len(texts)), lengths)[:windows]
+        hashes = hashes[np.arange(windows) + size <= ends[owner]]
+        counts = lengths - size + 1
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        buffer = np.empty((0, self.num_perm), dtype=np.uint64)
+        first = 0
+        while first < len(texts):
+            # Whole texts per chunk, so each text's minimum is taken in one pass
+            last = max(int(np.searchsorted(starts, starts[first] + HASH_CHUNK, side='right')), first + 1)
+            begin = starts[first]
+            end = starts[last] if last < len(texts) else len(hashes)
+            if end - begin > len(buffer):
+                buffer = np.empty((end - begin, self.num_perm), dtype=np.uint64)
+            permuted = buffer[:end - begin]
+            np.multiply(hashes[begin:end, None], self.a, out=permuted)
+            permuted += self.b
+            permuted >>= np.uint64(32)
+            result[first:last] = np.minimum.reduceat(permuted, starts[first:last] - begin, axis=0)
+            first = last
+        return result
+
+    def refresh(self, posts):
+        """Bring the index in line with the catalogue, hashing only new or edited posts.
+
+        Returns True if anything changed.
+        """
+        import numpy as np
+
+        ids = [str(post['id']) for post in posts]
+        contents = [post['content'] for post in posts]
+        digests = np.array([content_digest(content) for content in contents], dtype=np.uint64)
+        previous = {key: row for row, key in enumerate(zip(self.ids, self.digests.tolist()))}
+        signatures = np.zeros((len(ids), self.num_perm), dtype=np.uint32)
+        stale = []
+        for row, key in enumerate(zip(ids, digests.tolist())):
+            old = previous.get(key)
+            if old is not None:
+                signatures[row] = self.signatures[old]
+            else:
+                stale.append(row)
+        if stale:
+            signatures[stale] = self.compute(contents[row] for row in stale)
+        if not stale and ids == self.ids and np.array_equal(digests, self.digests):
+            return False
+        self._set(ids, digests, signatures)
+        self.dirty = True
+        return True
+
+    def similarity(self, first, second):
+        """Estimated Jaccard similarity of two posts' shingle sets, the closest entries if an ID repeats."""
+        a = self.signatures[self.rows[first]]
+        b = self.signatures[self.rows[second]]
+        return float((a[:, None] == b[None]).mean(axis=2).max())
+
+    def too_similar(self, post_id, other_ids, threshold=SIMILARITY_THRESHOLD):
+        """Return (other_id, score) for the closest of other_ids near-identical to post_id, or None."""
+        import numpy as np
+
+        rows = self.rows.get(post_id)
+        if rows is None:
+            return None
+        # Reposting the same post is governed by its cooldown, not by similarity
+        others = [row for other in other_ids if other != post_id for row in self.rows.get(other, ())]
+        if not others:
+            return None
+        others = np.array(others)
+        shared = (self.band_keys[others][:, None] == self.band_keys[rows][None]).any(axis=(1, 2))
+        others = others[shared]
+        if not len(others):
+            return None
+        scores = (self.signatures[others][:, None] == self.signatures[rows][None]).mean(axis=2).max(axis=1)
+        best = int(scores.argmax())
+        if scores[best] < threshold:
+            return None
+        return self.ids[others[best]], float(scores[best])
+
+    def near_duplicates(self, threshold=SIMILARITY_THRESHOLD):
+        """All (post_id, other_id, score) pairs at or above threshold, from posts sharing a band key."""
+        import numpy as np
+
+        pairs = set()
+        for band in range(self.bands):
+            keys = self.band_keys[:, band]
+            order = np.argsort(keys, kind='stable')
+            ordered = keys[order]
+            boundaries = np.flatnonzero(np.diff(ordered)) + 1
+            for group in np.split(order, boundaries):
+                if len(group) < 2:
+                    continue
+                group = sorted(group.tolist())
+                pairs.update((a, b) for i, a in enumerate(group) for b in group[i + 1:])
+        if not pairs:
+            return []
+        first, second = np.array(sorted(pairs)).T
+        scores = (self.signatures[first] == self.signatures[second]).mean(axis=1)
+        return [
+            (self.ids[a], self.ids[b], float(score))
+            for a, b, score in zip(first.tolist(), second.tolist(), scores.tolist())
+            if score >= threshold
+        ]
@@ -0,0 +1,203 @@
+import numbers
+import re
+import string
+import threading
+import unicodedata
+from collections import OrderedDict
+from functools import lru_cache
+
+TWEET_LIMIT = 280
+TELEGRAM_CAPTION_LIMIT = 1024
+# Twitter counts every link as a t.co URL of this length
+TWEET_URL_LENGTH = 23
+RENDER_CACHE_SIZE = 256
+# Rendered in place of a number too wide for its slot; cutting digits would change its value
+NUMBER_OVERFLOW = 'N/A'
+
+_URL = re.compile(r'https?://\S+')
+_MARKDOWN = re.compile(r'[*_`]')
+# Twitter counts these code points as one character; everything else (emoji, CJK) counts as two
+_HEAVY = re.compile(r'[^\u0000-\u10ff\u2000-\u200d\u2010-\u201f\u2032-\u2037]')
+# A whole emoji sequence (presentation selector, skin tone, tags, ZWJ joins, flags, keycaps) counts as two
+_EMOJI_BASE = r'(?:[\u00a9\u00ae]\ufe0f|[\u203c\u2049\u2122\u2139\u2194-\u21aa\u231a-\u23ff\u24c2\u25aa-\u27bf' \
+              r'\u2934\u2935\u2b05-\u2b55\u3030\u303d\u3297\u3299\U0001f000-\U0001faff])'
+_EMOJI_MODIFIERS = r'(?:[\ufe0e\ufe0f\U0001f3fb-\U0001f3ff\U000e0020-\U000e007f])*'
+_EMOJI = re.compile(
+    r'[\U0001f1e6-\U0001f1ff]{2}|[0-9#*]\ufe0f?\u20e3'
+    rf'|{_EMOJI_BASE}{_EMOJI_MODIFIERS}(?:\u200d{_EMOJI_BASE}{_EMOJI_MODIFIERS})*'
+)
+
+
+class TemplateError(ValueError):
+    """A template is malformed, or its longest rendering exceeds its limit."""
+
+
+def tweet_length(text):
+    """Length of text as Twitter counts it: links as 23, each emoji sequence and CJK character as 2."""
+    urls = _URL.findall(text)
+    if urls:
+        text = _URL.sub('', text)
+    if text.isascii():
+        return len(urls) * TWEET_URL_LENGTH + len(text)
+    text = unicodedata.normalize('NFC', text)
+    emoji = _EMOJI.findall(text)
+    if emoji:
+        text = _EMOJI.sub('', text)
+    return len(urls) * TWEET_URL_LENGTH + 2 * len(emoji) + len(text) + len(_HEAVY.findall(text))
+
+
+def caption_length(text):
+    """Length of a Markdown caption as Telegram counts it: UTF-16 code units, after the entity markers are parsed out."""
+    text = _MARKDOWN.sub('', text)
+    if text.isascii():
+        return len(text)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _escape(text):
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+def _fit(value, spec, width, length):
+    """Format value for a slot of at most width, as measured by length."""
+    text = format(value, spec)
+    if width is None or length(text) <= width:
+        return text
+    if isinstance(value, numbers.Number):
+        if length(NUMBER_OVERFLOW) > width:
+            raise TemplateError(f"{text} does not fit in a slot of width {width}")
+        return NUMBER_OVERFLOW
+    end = min(len(text), width)
+    while end and length(text[:end]) > width:
+        end -= 1
+    return text[:end]
+
+
+class Template:
+    """A format string parsed once into literal and slot segments.
+
+    Each slot may declare a maximum width; longer strings are truncated and
+    numbers too wide to fit render as NUMBER_OVERFLOW.
+    With every slot bounded, the longest possible rendering is known at
+    compile time, and a template that could exceed limit is rejected then
+    rather than when a post is sent. Renders are cached per slot values.
+    """
+
+    def __init__(self, source, widths=None, limit=None, length=len, cache_size=RENDER_CACHE_SIZE):
+        self.source = source
+        self.widths = dict(widths or {})
+        self.limit = limit
+        self.length = length
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.segments = []
+        try:
+            parsed = list(string.Formatter().parse(source))
+        except ValueError as e:
+            raise TemplateError(f"Invalid template {source!r}: {e}") from e
+        for literal, name, spec, conversion in parsed:
+            if name is not None and (not name.isidentifier() or conversion or '{' in (spec or '')):
+                raise TemplateError(f"Unsupported slot {{{name}}} in {source!r}")
+            self.segments.append((literal, name, spec or '', self.widths.get(name)))
+        self.slots = tuple(dict.fromkeys(name for _, name, _, _ in self.segments if name is not None))
+
+        unbounded = [name for name in self.slots if name not in self.widths]
+        self.max_length = None if unbounded else (
+            length(''.join(literal for literal, _, _, _ in self.segments))
+            + sum(width for _, name, _, width in self.segments if name is not None)
+        )
+        if limit is not None:
+            if unbounded:
+                raise TemplateError(f"Slots {', '.join(unbounded)} need a width to check the {limit} limit")
+            if self.max_length > limit:
+                raise TemplateError(f"Template can render {self.max_length} characters, over the {limit} limit")
+
+    def bind(self, values, limit=None):
+        """Fill some slots now, returning a new compiled template checked against limit (or this one's)."""
+        parts = []
+        for literal, name, spec, width in self.segments:
+            parts.append(_escape(literal))
+            if name is None:
+                continue
+            if name in values:
+                parts.append(_escape(_fit(values[name], spec, width, self.length)))
+            else:
+                parts.append(f"{{{name}:{spec}}}" if spec else f"{{{name}}}")
+        widths = {name: width for name, width in self.widths.items() if name not in values}
+        return Template(''.join(parts), widths, limit if limit is not None else self.limit,
+                        self.length, self.cache_size)
+
+    def _render(self, values):
+        out = []
+        for literal, name, spec, width in self.segments:
+            out.append(literal)
+            if name is not None:
+                out.append(_fit(values[name], spec, width, self.length))
+        return ''.join(out)
+
+    def render(self, values=None, **kwargs):
+        """Render with the given slot values; identical values reuse the cached text."""
+        if kwargs:
+            values = {**values, **kwargs} if values else kwargs
+        values = values or {}
+        if not self.cache_size:
+            return self._render(values)
+        try:
+            # 1, 1.0 and True compare equal but format differently, so the type is part of the key
+            key = tuple((type(values[name]), values[name]) for name in self.slots)
+            hash(key)
+        except TypeError:
+            return self._render(values)
+        with self.lock:
+            text = self.cache.get(key)
+            if text is not None:
+                self.cache.move_to_end(key)
+                return text
+        text = self._render(values)
+        with self.lock:
+            self.cache[key] = text
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return text
+
+    def render_many(self, rows, **common):
+        """Render one text per row in a single pass; common values apply to every row."""
+        render = self.render
+        if common:
+            return [render({**common, **row}) for row in rows]
+        return [render(row) for row in rows]
+
+
+@lru_cache(maxsize=None)
+def _compile(source, limit, length, cache_size, widths):
+    return Template(source, dict(widths), limit, length, cache_size)
+
+
+def compile_template(source, limit=None, length=len, cache_size=RENDER_CACHE_SIZE, **widths):
+    """Parse source once; keyword arguments give each slot's maximum width."""
+    return _compile(source, limit, length, cache_size, tuple(sorted(widths.items())))
+
+
+def _max_length(part, length):
+    return part.max_length if isinstance(part, Template) else length(part)
+
+
+def fit_count(limit, fixed, repeated, length=len):
+    """How many copies of the repeated parts always fit in limit alongside the fixed parts."""
+    room = limit - sum(_max_length(part, length) for part in fixed)
+    return max(0, room // sum(_max_length(part, length) for part in repeated))
+
+
+def check_fits(limit, *parts, length=len):
+    """Raise TemplateError unless the parts, at their longest, fit in limit together."""
+    total = sum(_max_length(part, length) for part in parts)
+    if total > limit:
+        raise TemplateError(f"Layout can render {total} characters, over the {limit} limit")
+    return total
+
+
+# Appended to every tweet by app.py
+POSTED_AT = compile_template("{content}\n\nPosted at: {timestamp}", length=tweet_length, cache_size=0, timestamp=23)
+# Room left for catalogue content once the timestamp is appended
+CONTENT_LIMIT = TWEET_LIMIT - POSTED_AT.bind({'content': ''}).max_length
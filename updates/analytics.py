@@ -0,0 +1,137 @@
+import hashlib
+import io
+import threading
+import warnings
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# CoinGecko 7d sparklines are hourly points
+POINTS_PER_DAY = 24
+SMA_WINDOW = 24
+CHART_PANELS = 8
+CHART_CACHE_SIZE = 16
+PANEL_SIZE = (320, 140)
+BACKGROUND = (18, 22, 33)
+LINE_UP = (38, 198, 118)
+LINE_DOWN = (234, 67, 83)
+SMA_COLOR = (240, 185, 11)
+TEXT_COLOR = (230, 230, 230)
+
+
+def moving_average(matrix: np.ndarray, window: int) -> np.ndarray:
+    """NaN-aware trailing moving average along each row, computed from cumulative sums."""
+    valid = ~np.isnan(matrix)
+    filled = np.where(valid, matrix, 0.0)
+    zeros = np.zeros((matrix.shape[0], 1))
+    sums = np.concatenate([zeros, np.cumsum(filled, axis=1)], axis=1)
+    counts = np.concatenate([zeros, np.cumsum(valid, axis=1)], axis=1)
+    window = min(window, matrix.shape[1])
+    window_sums = sums[:, window:] - sums[:, :-window]
+    window_counts = counts[:, window:] - counts[:, :-window]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sma = window_sums / window_counts
+    # Leading points without a full window stay NaN so the series lines up with the prices
+    return np.concatenate([np.full((matrix.shape[0], window - 1), np.nan), sma], axis=1)
+
+
+class SparklineAnalytics:
+    """Vectorised 7d sparkline statistics for every token in a /coins/markets response."""
+
+    def __init__(self, data: List[Dict[str, Any]]) -> None:
+        series = [np.asarray((item.get("sparkline_in_7d") or {}).get("price") or [], dtype=float) for item in data]
+        length = max((len(s) for s in series), default=0)
+        self.symbols = [item["symbol"].upper() for item in data]
+        # Right-align series of different lengths so the latest points share a column
+        self.prices = np.full((len(series), length), np.nan)
+        for row, s in enumerate(series):
+            if len(s):
+                self.prices[row, length - len(s):] = s
+        self.key = hashlib.sha256(self.prices.tobytes() + "|".join(self.symbols).encode()).hexdigest()
+
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            # Tokens without a sparkline are all-NaN rows; their stats are simply NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            self.low = np.nanmin(self.prices, axis=1)
+            self.high = np.nanmax(self.prices, axis=1)
+            returns = np.diff(np.log(self.prices), axis=1)
+            # Daily volatility in percent, from hourly log returns
+            self.volatility = np.nanstd(returns, axis=1) * np.sqrt(POINTS_PER_DAY) * 100
+            running_peak = np.fmax.accumulate(np.nan_to_num(self.prices, nan=-np.inf), axis=1)
+            self.max_drawdown = np.nanmin(self.prices / running_peak - 1, axis=1) * 100
+        self.sma = moving_average(self.prices, SMA_WINDOW)
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def has_data(self, row: int) -> bool:
+        """True if the row has at least two prices and finite stats; a single point has no returns to measure."""
+        return bool(
+            np.count_nonzero(~np.isnan(self.prices[row])) >= 2
+            and np.isfinite(self.volatility[row])
+            and np.isfinite(self.max_drawdown[row])
+        )
+
+
+def analyze(data: List[Dict[str, Any]]) -> Optional[SparklineAnalytics]:
+    """Returns analytics for the response, or None if it carries no sparkline data."""
+    if not data or not any((item.get("sparkline_in_7d") or {}).get("price") for item in data):
+        return None
+    return SparklineAnalytics(data)
+
+
+_chart_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_chart_lock = threading.Lock()
+
+
+def _polyline(values: np.ndarray, box, low: float, high: float):
+    left, top, right, bottom = box
+    valid = ~np.isnan(values)
+    if valid.sum() < 2:
+        return []
+    xs = np.linspace(left, right, len(values))[valid]
+    span = (high - low) or 1.0
+    ys = bottom - (values[valid] - low) / span * (bottom - top)
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
+def render_chart(stats: SparklineAnalytics, panels: int = CHART_PANELS) -> bytes:
+    """Draws a PNG grid of 7d sparklines with their 24h moving average, entirely in memory."""
+    with _chart_lock:
+        if stats.key in _chart_cache:
+            _chart_cache.move_to_end(stats.key)
+            return _chart_cache[stats.key]
+
+    rows = [row for row in range(len(stats)) if stats.has_data(row)][:panels]
+    columns = 2 if len(rows) > 1 else 1
+    grid_rows = max(1, (len(rows) + columns - 1) // columns)
+    width, height = PANEL_SIZE
+    image = Image.new("RGB", (width * columns, height * grid_rows), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default()
+
+    for slot, row in enumerate(rows):
+        x0 = (slot % columns) * width
+        y0 = (slot // columns) * height
+        box = (x0 + 10, y0 + 28, x0 + width - 10, y0 + height - 10)
+        low, high = stats.low[row], stats.high[row]
+        prices = stats.prices[row]
+        last = prices[~np.isnan(prices)][-1]
+        first = prices[~np.isnan(prices)][0]
+        color = LINE_UP if last >= first else LINE_DOWN
+        draw.text((x0 + 10, y0 + 8), f"{stats.symbols[row]}  {(last / first - 1) * 100:+.2f}% 7d", fill=TEXT_COLOR, font=font)
+        sma_points = _polyline(stats.sma[row], box, low, high)
+        if sma_points:
+            draw.line(sma_points, fill=SMA_COLOR, width=1)
+        draw.line(_polyline(prices, box, low, high), fill=color, width=2)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    png = buffer.getvalue()
+    with _chart_lock:
+        _chart_cache[stats.key] = png
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+    return png
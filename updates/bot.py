@@ -1,55 +1,80 @@
 import os
-import time
-import requests
+import math
+import asyncio
 from datetime import datetime
 from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.error import TelegramError
 from typing import Optional, List, Dict, Any
-import schedule  # Make sure to install 'schedule' package for the scheduler
+from market_data import MarketDataService, log_message
+from watchlist import PriceTable, load_watchlist
+from analytics import SparklineAnalytics, analyze, render_chart
+from scheduler import AsyncScheduler
+from fanout import Channel, FanOut, parse_channels
+import metrics
+from templates import TELEGRAM_CAPTION_LIMIT, caption_length, check_fits, compile_template, fit_count
 
 # Direct API settings
-COINGECKO_URL = "https://api.coingecko.com/api/v3/coins/markets"
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
 POST_ID = int(os.getenv("POST_ID", "6"))  # Default post ID for main channel update
+TOP_N = int(os.getenv("TOP_N", "4"))  # Tokens by market cap, unless WATCHLIST lists coin IDs
+JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", "120"))  # Upper bound on a single scheduled job
+# Optional fan-out list, e.g. "@channel_a:6,-1001234567890:42" (chat_id[:post_id])
+CHANNELS = parse_channels(os.getenv("CHANNELS") or CHANNEL_ID or "", POST_ID)
+
+# Caption templates, compiled once; slot widths bound every value so lengths are checked here
+COIN_WIDTHS = dict(i=2, name=24, symbol=10, trend=2, price=16, market_cap=10, change_24h=8, change_7d=8, rank=4)
+MAIN_POST_HEADER = compile_template(
+    "🌟 *Top {count} Cryptocurrencies by Market Cap* 🌟\n\n_Last Updated: {timestamp}_\n\n",
+    length=caption_length, count=3, timestamp=20
+)
+MAIN_POST_COIN = compile_template(
+    "{i}. *{name}* ({symbol}) {trend}\n"
+    "💰 Price: ${price:,.2f}\n"
+    "📊 Market Cap: {market_cap}\n"
+    "📈 24h Change: {change_24h:+.2f}%\n"
+    "📊 7d Change: {change_7d:+.2f}%\n"
+    "🏆 Rank: #{rank}\n",
+    length=caption_length, **COIN_WIDTHS
+)
+MAIN_POST_STATS = compile_template(
+    "📐 7d Vol: {volatility:.1f}%/day | Max DD: {drawdown:.1f}%\n",
+    length=caption_length, volatility=7, drawdown=7
+)
+MAIN_POST_FOOTER = "\n🔄 Updates every 30 minutes\n💬 Join @InvisibleSolAI for more crypto updates!"
+# Coins the pinned caption can always hold, stats included
+MAIN_POST_MAX_COINS = fit_count(
+    TELEGRAM_CAPTION_LIMIT, [MAIN_POST_HEADER, MAIN_POST_FOOTER], [MAIN_POST_COIN, MAIN_POST_STATS, "\n"],
+    length=caption_length
+)
+SHORT_POST_HEADER = compile_template("🕒 *Hourly Crypto Update* - {timestamp} 🕒\n\n", length=caption_length, timestamp=20)
+SHORT_POST_COIN = compile_template(
+    "{i}. *{name}* ({symbol}) {trend}\n💰 ${price:,.2f} | 24h: {change_24h:+.2f}%\n\n",
+    length=caption_length, **COIN_WIDTHS
+)
+SHORT_POST_COINS = 2
+check_fits(TELEGRAM_CAPTION_LIMIT, SHORT_POST_HEADER, *[SHORT_POST_COIN] * SHORT_POST_COINS, length=caption_length)
 
 # Validate necessary environment variables
-if not all([BOT_TOKEN, CHANNEL_ID, POST_ID]):
-    raise ValueError("Environment variables BOT_TOKEN, CHANNEL_ID, and POST_ID must be set")
+if not all([BOT_TOKEN, CHANNELS, POST_ID]):
+    raise ValueError("Environment variables BOT_TOKEN, CHANNEL_ID (or CHANNELS), and POST_ID must be set")
 
 # Initialize Telegram bot
 bot = Bot(token=BOT_TOKEN)
 
-def log_message(message: str) -> None:
-    """Logs a message with timestamp."""
-    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+# Market data shared by all scheduled jobs
+market_data = MarketDataService(
+    per_page=TOP_N,
+    ids=[coin["id"] for coin in load_watchlist()] if os.getenv("WATCHLIST") else None
+)
 
-def fetch_data(max_retries: int = 3, delay: int = 5) -> Optional[List[Dict[str, Any]]]:
-    """Fetches top 4 cryptocurrency data from CoinGecko with retries on failure."""
-    for attempt in range(max_retries):
-        try:
-            log_message("Fetching top 4 cryptocurrencies data from CoinGecko API...")
-            response = requests.get(
-                COINGECKO_URL,
-                params={
-                    "vs_currency": "usd",
-                    "order": "market_cap_desc",
-                    "per_page": 4,  # Limit to top 4 tokens
-                    "page": 1,
-                    "sparkline": True,
-                    "price_change_percentage": "24h,7d,30d"
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            data = response.json()
-            log_message(f"Successfully fetched data for {len(data)} tokens.")
-            return data
-        except requests.RequestException as e:
-            log_message(f"Error fetching data (attempt {attempt + 1}): {e}")
-            time.sleep(delay)
-    log_message("All retries failed; could not fetch data.")
-    return None
+# One render, many channels
+fanout = FanOut(CHANNELS)
+
+def fetch_data(max_retries: int = 3, delay: int = 5, sparkline: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """Fetches top 4 cryptocurrency data through the shared, cached market-data service."""
+    with metrics.timer("bot_fetch_data_seconds", sparkline=sparkline):
+        return market_data.get(sparkline=sparkline, max_retries=max_retries, delay=delay)
 
 def format_market_cap(market_cap: float) -> str:
     """Formats market cap with B/M suffix for readability."""
@@ -67,43 +92,50 @@ def get_trend_emoji(change: float) -> str:
         return "📉"
     return "💥"
 
-def format_main_post(data: List[Dict[str, Any]]) -> str:
-    """Formats detailed top 4 tokens data for the main pinned post with emojis."""
+def _or_zero(value: float) -> float:
+    return 0.0 if math.isnan(value) else value
+
+def format_rank(rank: float) -> str:
+    return "N/A" if math.isnan(rank) else str(int(rank))
+
+def coin_slots(table: PriceTable) -> List[Dict[str, Any]]:
+    """Slot values for each coin in the table, shared by the main and short templates."""
+    rows = []
+    for i, coin in enumerate(table, 1):
+        price_change_24h = _or_zero(coin.change_24h)
+        rows.append({
+            "i": i,
+            "name": coin.name,
+            "symbol": coin.symbol,
+            "trend": get_trend_emoji(price_change_24h),
+            "price": _or_zero(coin.price),
+            "market_cap": format_market_cap(_or_zero(coin.market_cap)),
+            "change_24h": price_change_24h,
+            "change_7d": _or_zero(coin.change_7d),
+            "rank": format_rank(coin.rank),
+        })
+    return rows
+
+def format_main_post(data: List[Dict[str, Any]], stats: Optional[SparklineAnalytics] = None) -> str:
+    """Formats detailed token data for the main pinned post with emojis, plus 7d sparkline stats if given."""
+    # Never more coins than the caption limit allows
+    table = PriceTable.from_markets(data[:MAIN_POST_MAX_COINS])
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M UTC")
-    formatted = (
-        f"🌟 *Top 4 Cryptocurrencies by Market Cap* 🌟\n\n"
-        f"_Last Updated: {current_time}_\n\n"
-    )
-    for i, item in enumerate(data, 1):
-        price_change_24h = item.get("price_change_percentage_24h", 0) or 0
-        price_change_7d = item.get("price_change_percentage_7d", 0) or 0
-        trend_emoji = get_trend_emoji(price_change_24h)
-        
-        formatted += (
-            f"{i}. *{item['name']}* ({item['symbol'].upper()}) {trend_emoji}\n"
-            f"💰 Price: ${item.get('current_price', 0):,.2f}\n"
-            f"📊 Market Cap: {format_market_cap(item.get('market_cap', 0))}\n"
-            f"📈 24h Change: {price_change_24h:+.2f}%\n"
-            f"📊 7d Change: {price_change_7d:+.2f}%\n"
-            f"🏆 Rank: #{item.get('market_cap_rank', 'N/A')}\n\n"
-        )
-    formatted += "\n🔄 Updates every 30 minutes\n💬 Join @InvisibleSolAI for more crypto updates!"
-    return formatted
+    parts = [MAIN_POST_HEADER.render(count=len(table), timestamp=current_time)]
+    for row, block in enumerate(MAIN_POST_COIN.render_many(coin_slots(table))):
+        parts.append(block)
+        if stats and stats.has_data(row):
+            parts.append(MAIN_POST_STATS.render(volatility=stats.volatility[row], drawdown=stats.max_drawdown[row]))
+        parts.append("\n")
+    parts.append(MAIN_POST_FOOTER)
+    return "".join(parts)
 
 def format_short_post(data: List[Dict[str, Any]]) -> str:
     """Formats a brief update with top 2 cryptocurrencies for hourly posts."""
+    table = PriceTable.from_markets(data[:SHORT_POST_COINS])  # Show only top 2 in short update
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M UTC")
-    formatted = f"🕒 *Hourly Crypto Update* - {current_time} 🕒\n\n"
-    
-    for i, item in enumerate(data[:2], 1):  # Show only top 2 in short update
-        price_change_24h = item.get("price_change_percentage_24h", 0) or 0
-        trend_emoji = get_trend_emoji(price_change_24h)
-        
-        formatted += (
-            f"{i}. *{item['name']}* ({item['symbol'].upper()}) {trend_emoji}\n"
-            f"💰 ${item.get('current_price', 0):,.2f} | 24h: {price_change_24h:+.2f}%\n\n"
-        )
-    return formatted.strip()
+    header = SHORT_POST_HEADER.render(timestamp=current_time)
+    return (header + "".join(SHORT_POST_COIN.render_many(coin_slots(table)))).strip()
 
 def create_inline_keyboard() -> InlineKeyboardMarkup:
     """Creates a custom inline keyboard with relevant links."""
@@ -119,59 +151,104 @@ def create_inline_keyboard() -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def send_main_post(image_url: str) -> None:
+def edit_main_post(channel: Channel, media: Any, text: str) -> Any:
+    """Replaces the pinned post's media and caption in one channel."""
+    with metrics.timer("telegram_call_seconds", method="editMessageMedia"):
+        return bot.edit_message_media(
+            chat_id=channel.chat_id,
+            message_id=channel.post_id,
+            media=InputMediaPhoto(media=media, caption=text, parse_mode="Markdown"),
+            reply_markup=create_inline_keyboard()
+        )
+
+def send_update_photo(channel: Channel, media: Any, text: str) -> Any:
+    """Sends a new photo update to one channel."""
+    with metrics.timer("telegram_call_seconds", method="sendPhoto"):
+        return bot.send_photo(
+            chat_id=channel.chat_id,
+            photo=media,
+            caption=text,
+            parse_mode="Markdown",
+            reply_markup=create_inline_keyboard()
+        )
+
+def main_post_media(image_url: str, stats: Optional[SparklineAnalytics]) -> Any:
+    """Returns (media_key, media): the rendered sparkline chart, or the static image if that fails."""
+    if stats is not None:
+        try:
+            with metrics.timer("bot_render_chart_seconds"):
+                return stats.key, render_chart(stats)
+        except Exception as e:
+            log_message(f"Error rendering chart, using static image: {e}")
+    return image_url, image_url
+
+def send_main_post(image_url: str, data: Optional[List[Dict[str, Any]]] = None) -> None:
     """Posts or updates the main pinned post with detailed token data."""
-    data = fetch_data()
+    data = data or fetch_data(sparkline=True)
     if not data:
         log_message("Failed to fetch data for main post.")
         return
     
-    text = format_main_post(data)
+    stats = analyze(data)
+    text = format_main_post(data, stats)
+    _, media = main_post_media(image_url, stats)
     try:
-        bot.edit_message_media(
-            chat_id=CHANNEL_ID,
-            message_id=POST_ID,
-            media=InputMediaPhoto(media=image_url, caption=text, parse_mode="Markdown"),
-            reply_markup=create_inline_keyboard()
-        )
+        edit_main_post(CHANNELS[0], media, text)
         log_message("Main pinned post updated successfully.")
     except TelegramError as e:
         log_message(f"Error updating main post: {e}")
 
-def post_hourly_update(image_url: str) -> None:
+def post_hourly_update(image_url: str, data: Optional[List[Dict[str, Any]]] = None) -> None:
     """Posts a short, hourly update with top 2 cryptocurrencies."""
-    data = fetch_data()
+    data = data or fetch_data()
     if not data:
         log_message("Failed to fetch data for hourly update.")
         return
     
     text = format_short_post(data)
     try:
-        bot.send_photo(
-            chat_id=CHANNEL_ID,
-            photo=image_url,
-            caption=text,
-            parse_mode="Markdown",
-            reply_markup=create_inline_keyboard()
-        )
+        send_update_photo(CHANNELS[0], image_url, text)
         log_message("Hourly update posted successfully.")
     except TelegramError as e:
         log_message(f"Error posting hourly update: {e}")
 
+async def send_main_post_job(image_url: str) -> None:
+    """Fetches data once without blocking the loop, then updates the pinned post in every channel."""
+    data = await market_data.get_async(sparkline=True)
+    if not data:
+        log_message("Failed to fetch data for main post.")
+        return
+    stats = analyze(data)
+    text = format_main_post(data, stats)
+    media_key, media = await asyncio.to_thread(main_post_media, image_url, stats)
+    await fanout.deliver(lambda channel, payload: edit_main_post(channel, payload, text), media_key, media)
+    metrics.flush()
+
+async def post_hourly_update_job(image_url: str) -> None:
+    """Fetches data once without blocking the loop, then sends the hourly update to every channel."""
+    data = await market_data.get_async()
+    if not data:
+        log_message("Failed to fetch data for hourly update.")
+        return
+    text = format_short_post(data)
+    await fanout.deliver(lambda channel, media: send_update_photo(channel, media, text), image_url)
+    metrics.flush()
+
 def main() -> None:
-    """Main scheduler loop to run updates."""
+    """Runs the asyncio scheduler for all updates."""
     log_message("Starting InvisibleSolAI Crypto Bot...")
+    if metrics.serve():
+        log_message(f"Serving metrics on port {metrics.METRICS_PORT}")
     
     image_url = "https://static.news.bitcoin.com/wp-content/uploads/2019/01/bj2rNGhZ-ezgif-2-e18c3be26209.gif"
     
     # Schedule tasks
-    schedule.every().hour.at(":00").do(post_hourly_update, image_url=image_url)  # Post short update every hour
-    schedule.every().hour.at(":30").do(send_main_post, image_url=image_url)      # Update main pinned post every 30 minutes
+    scheduler = AsyncScheduler()
+    scheduler.every_hour_at(0, post_hourly_update_job, timeout=JOB_TIMEOUT, image_url=image_url)  # Post short update every hour
+    scheduler.every_hour_at(30, send_main_post_job, timeout=JOB_TIMEOUT, image_url=image_url)     # Update main pinned post every 30 minutes
 
-    # Continuous run to check for pending scheduled tasks
-    while True:
-        schedule.run_pending()
-        time.sleep(30)
+    # Jobs run concurrently; each wakes exactly when due
+    asyncio.run(scheduler.run())
 
 if __name__ == "__main__":
     try:
@@ -180,4 +257,3 @@ if __name__ == "__main__":
         log_message("Bot stopped by user.")
     except Exception as e:
         log_message(f"Fatal error: {e}")
-
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from market_data import log_message
+
+# Telegram allows about 30 messages/s overall and about 1 message/s per chat
+GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "8"))
+# Remembered uploads; rendered charts get a new key every run
+MAX_FILE_IDS = 64
+
+
+class Channel:
+    """A destination chat and, for the pinned post, the message to edit."""
+
+    def __init__(self, chat_id: str, post_id: Optional[int] = None) -> None:
+        self.chat_id = chat_id
+        self.post_id = post_id
+
+    def __repr__(self) -> str:
+        return f"Channel({self.chat_id!r}, {self.post_id!r})"
+
+
+def parse_channels(spec: str, default_post_id: Optional[int] = None) -> List[Channel]:
+    """Parses 'chat_id[:post_id],...' into channels, e.g. '@news:6,-100123:42'."""
+    channels = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        chat_id, sep, post_id = part.rpartition(":")
+        if sep and post_id.lstrip("-").isdigit():
+            channels.append(Channel(chat_id, int(post_id)))
+        else:
+            channels.append(Channel(part, default_post_id))
+    return channels
+
+
+class TokenBucket:
+    """Asyncio token bucket refilled continuously at rate tokens per second."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def uploaded_file_id(message: Any) -> Optional[str]:
+    """Returns the file_id Telegram assigned to the media in a sent message."""
+    if not message or message is True:
+        return None
+    if getattr(message, "photo", None):
+        return message.photo[-1].file_id
+    for attr in ("animation", "video", "document"):
+        media = getattr(message, attr, None)
+        if media:
+            return media.file_id
+    return None
+
+
+class FanOut:
+    """Sends one rendered update to many channels with bounded concurrency and rate limits.
+
+    The media is uploaded once (to the first channel that accepts it) and
+    every other channel receives the returned file_id.
+    """
+
+    def __init__(self, channels: List[Channel], concurrency: int = FANOUT_CONCURRENCY,
+                 global_rate: float = GLOBAL_RATE, per_chat_rate: float = PER_CHAT_RATE) -> None:
+        self.channels = channels
+        self.concurrency = concurrency
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self.global_bucket: Optional[TokenBucket] = None
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        # media source (e.g. image URL) -> file_id returned by Telegram
+        self.file_ids: Dict[str, str] = {}
+
+    async def _send_one(self, channel: Channel, send: Callable[[Channel, Any], Any], media: Any) -> Any:
+        bucket = self.chat_buckets.get(channel.chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[channel.chat_id] = TokenBucket(self.per_chat_rate, 1)
+        await bucket.acquire()
+        await self.global_bucket.acquire()
+        return await asyncio.to_thread(send, channel, media)
+
+    async def deliver(self, send: Callable[[Channel, Any], Any], media_key: str,
+                      media: Any = None) -> Dict[str, Optional[float]]:
+        """Calls send(channel, media) for every channel; returns per-channel latency in seconds (None on failure)."""
+        # Buckets hold an asyncio.Lock, so create them on the running loop
+        if self.global_bucket is None:
+            self.global_bucket = TokenBucket(self.global_rate)
+        media = media if media is not None else media_key
+        latencies: Dict[str, Optional[float]] = {}
+        pending = list(self.channels)
+
+        async def timed(channel: Channel, payload: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                message = await self._send_one(channel, send, payload)
+                latencies[channel.chat_id] = time.perf_counter() - started
+                return message
+            except Exception as e:
+                latencies[channel.chat_id] = None
+                log_message(f"Delivery to {channel.chat_id} failed: {e}")
+                return None
+
+        # Upload the media once, then reuse Telegram's file_id everywhere else
+        while pending and media_key not in self.file_ids:
+            channel = pending.pop(0)
+            message = await timed(channel, media)
+            file_id = uploaded_file_id(message)
+            if file_id:
+                self.file_ids[media_key] = file_id
+                while len(self.file_ids) > MAX_FILE_IDS:
+                    del self.file_ids[next(iter(self.file_ids))]
+            elif message is not None:
+                # Delivered, but there is no file_id to reuse; send the rest as-is
+                break
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(channel: Channel) -> None:
+            async with semaphore:
+                await timed(channel, self.file_ids.get(media_key, media))
+
+        await asyncio.gather(*(bounded(channel) for channel in pending))
+
+        delivered = [v for v in latencies.values() if v is not None]
+        if delivered:
+            log_message(
+                f"Delivered to {len(delivered)}/{len(latencies)} channels "
+                f"(max {max(delivered):.2f}s, avg {sum(delivered) / len(delivered):.2f}s)"
+            )
+        for chat_id, latency in latencies.items():
+            log_message(f"  {chat_id}: " + (f"{latency:.2f}s" if latency is not None else "failed"))
+        return latencies
@@ -0,0 +1,184 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# Shared modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import http_client
+import metrics
+
+COINGECKO_URL = "https://api.coingecko.com/api/v3/coins/markets"
+# Seconds a fetched market snapshot is reused by later jobs
+MARKET_DATA_TTL = int(os.getenv("MARKET_DATA_TTL", "300"))
+# CoinGecko returns at most this many rows per markets request; longer watchlists are split into batches
+MARKETS_BATCH_SIZE = 250
+
+
+def log_message(message: str) -> None:
+    """Logs a message with timestamp."""
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}")
+
+
+class MarketDataService:
+    """Shared CoinGecko market fetcher with a TTL cache and request coalescing.
+
+    A snapshot fetched with sparklines also satisfies requests that don't
+    need them, so jobs only pay for the large sparkline payload when at
+    least one of them asks for it.
+    """
+
+    def __init__(self, ttl: int = MARKET_DATA_TTL, per_page: int = 4, ids: Optional[List[str]] = None) -> None:
+        self.ttl = ttl
+        self.ids = ids
+        self.per_page = per_page
+        self.lock = threading.Lock()
+        # sparkline flag -> (fetched_at, data)
+        self.cache: Dict[bool, Any] = {}
+        # sparkline flag -> Future of the request currently in flight
+        self.inflight: Dict[bool, Future] = {}
+        self.requests_made = 0
+
+    def _usable_flags(self, sparkline: bool):
+        return (True,) if sparkline else (False, True)
+
+    def _claim(self, sparkline: bool):
+        """Returns (cached_data, future, owner); the owner must fetch and complete the future."""
+        with self.lock:
+            now = time.monotonic()
+            for flag in self._usable_flags(sparkline):
+                entry = self.cache.get(flag)
+                if entry and now - entry[0] < self.ttl:
+                    return entry[1], None, False
+            for flag in self._usable_flags(sparkline):
+                future = self.inflight.get(flag)
+                if future:
+                    return None, future, False
+            future = Future()
+            self.inflight[sparkline] = future
+            return None, future, True
+
+    def _complete(self, sparkline: bool, future: Future, data: Optional[List[Dict[str, Any]]]) -> None:
+        with self.lock:
+            if data is not None:
+                self.cache[sparkline] = (time.monotonic(), data)
+            del self.inflight[sparkline]
+        future.set_result(data)
+
+    def get(self, sparkline: bool = False, max_retries: int = 3, delay: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Returns cached market data if fresh, otherwise fetches it once for all callers."""
+        data, future, owner = self._claim(sparkline)
+        if future is None:
+            metrics.inc("market_data_requests_total", result="cached")
+            return data
+        if not owner:
+            metrics.inc("market_data_requests_total", result="coalesced")
+            log_message("Waiting for market data request already in flight...")
+            return future.result()
+
+        try:
+            calls = self._calls(sparkline)
+            log_message(f"Fetching data for {self._count()} cryptocurrencies from CoinGecko API...")
+            self.requests_made += 1
+            metrics.inc("market_data_requests_total", result="fetched")
+            if len(calls) == 1:
+                url, params = next(iter(calls.values()))
+                data = http_client.get_json(url, params, max_retries, backoff=delay)
+            else:
+                data = self._merge(http_client.fetch_all(calls, max_retries=max_retries, backoff=delay))
+            if data is not None:
+                log_message(f"Successfully fetched data for {len(data)} tokens.")
+            return data
+        except (requests.RequestException, ValueError) as e:
+            log_message(f"All retries failed; could not fetch data: {e}")
+            return None
+        finally:
+            self._complete(sparkline, future, data)
+
+    async def get_async(self, sparkline: bool = False, max_retries: int = 3,
+                        delay: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Like get(), but waits and backs off without blocking the event loop."""
+        data, future, owner = self._claim(sparkline)
+        if future is None:
+            metrics.inc("market_data_requests_total", result="cached")
+            return data
+        if not owner:
+            metrics.inc("market_data_requests_total", result="coalesced")
+            log_message("Waiting for market data request already in flight...")
+            return await asyncio.wrap_future(future)
+
+        try:
+            calls = self._calls(sparkline)
+            log_message(f"Fetching data for {self._count()} cryptocurrencies from CoinGecko API...")
+            self.requests_made += 1
+            metrics.inc("market_data_requests_total", result="fetched")
+            if len(calls) == 1:
+                url, params = next(iter(calls.values()))
+                data = await http_client.get_json_async(url, params, max_retries, backoff=delay)
+            else:
+                results = await asyncio.gather(
+                    *(http_client.get_json_async(url, params, max_retries, backoff=delay)
+                      for url, params in calls.values()),
+                    return_exceptions=True
+                )
+                for name, result in zip(calls, results):
+                    if isinstance(result, Exception):
+                        log_message(f"Failed to fetch {name}: {result}")
+                data = self._merge({
+                    name: None if isinstance(result, Exception) else result
+                    for name, result in zip(calls, results)
+                })
+            if data is not None:
+                log_message(f"Successfully fetched data for {len(data)} tokens.")
+            return data
+        except (requests.RequestException, ValueError) as e:
+            log_message(f"All retries failed; could not fetch data: {e}")
+            return None
+        finally:
+            self._complete(sparkline, future, data)
+
+    def _count(self) -> int:
+        return len(self.ids) if self.ids else self.per_page
+
+    def _params(self, sparkline: bool, ids: Optional[List[str]] = None) -> Dict[str, Any]:
+        params = {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": len(ids) if ids else self.per_page,
+            "page": 1,
+            "sparkline": str(sparkline).lower(),
+            "price_change_percentage": "24h,7d,30d"
+        }
+        if ids:
+            params["ids"] = ",".join(ids)
+        return params
+
+    def _calls(self, sparkline: bool) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """One markets request for the top coins, or one per batch of watchlist IDs."""
+        if not self.ids:
+            return {"markets": (COINGECKO_URL, self._params(sparkline))}
+        return {
+            f"markets {start // MARKETS_BATCH_SIZE + 1}": (
+                COINGECKO_URL, self._params(sparkline, self.ids[start:start + MARKETS_BATCH_SIZE])
+            )
+            for start in range(0, len(self.ids), MARKETS_BATCH_SIZE)
+        }
+
+    def _merge(self, results: Dict[str, Optional[List[Dict[str, Any]]]]) -> Optional[List[Dict[str, Any]]]:
+        """Join batch results back into one list in market cap order; None if every batch failed."""
+        failed = [name for name, rows in results.items() if rows is None]
+        if len(failed) == len(results):
+            return None
+        if failed:
+            log_message(f"{len(failed)} of {len(results)} watchlist batches failed; continuing without them")
+        data = [row for rows in results.values() if rows for row in rows]
+        data.sort(key=lambda coin: coin.get("market_cap") or 0, reverse=True)
+        if not failed and len(data) < len(self.ids):
+            log_message(f"CoinGecko returned no data for {len(self.ids) - len(data)} watchlist IDs")
+        return data
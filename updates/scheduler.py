@@ -0,0 +1,71 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from market_data import log_message
+
+# Re-check the wall clock at least this often in case it jumps
+MAX_SLEEP_SECONDS = 300
+
+
+class Job:
+    """A scheduled callable, run hourly at a fixed minute."""
+
+    def __init__(self, name: str, func: Callable, timeout: float, kwargs: Dict[str, Any], minute: int) -> None:
+        self.name = name
+        self.func = func
+        self.timeout = timeout
+        self.kwargs = kwargs
+        self.minute = minute
+        self.task: Optional[asyncio.Task] = None
+        self.next_run = self.following(datetime.now())
+
+    def following(self, now: datetime) -> datetime:
+        """Returns the first due time strictly after now."""
+        due = now.replace(minute=self.minute, second=0, microsecond=0)
+        if due <= now:
+            due += timedelta(hours=1)
+        return due
+
+
+class AsyncScheduler:
+    """Runs jobs concurrently on an asyncio loop, waking exactly when the next one is due."""
+
+    def __init__(self) -> None:
+        self.jobs: List[Job] = []
+
+    def every_hour_at(self, minute: int, func: Callable, timeout: float = 300, **kwargs: Any) -> Job:
+        job = Job(func.__name__, func, timeout, kwargs, minute=minute)
+        self.jobs.append(job)
+        return job
+
+    async def run_job(self, job: Job) -> None:
+        """Runs one job under its timeout; blocking callables go to a worker thread."""
+        started = datetime.now()
+        try:
+            if asyncio.iscoroutinefunction(job.func):
+                await asyncio.wait_for(job.func(**job.kwargs), job.timeout)
+            else:
+                await asyncio.wait_for(asyncio.to_thread(job.func, **job.kwargs), job.timeout)
+            log_message(f"Job {job.name} finished in {(datetime.now() - started).total_seconds():.1f}s")
+        except asyncio.TimeoutError:
+            log_message(f"Job {job.name} timed out after {job.timeout}s")
+        except Exception as e:
+            log_message(f"Job {job.name} failed: {e}")
+
+    async def run(self) -> None:
+        for job in self.jobs:
+            log_message(f"Scheduled {job.name}, next run at {job.next_run:%Y-%m-%d %H:%M:%S}")
+        while True:
+            now = datetime.now()
+            for job in self.jobs:
+                if job.next_run > now:
+                    continue
+                if job.task and not job.task.done():
+                    log_message(f"Skipping {job.name}: previous run still in progress")
+                else:
+                    job.task = asyncio.create_task(self.run_job(job))
+                job.next_run = job.following(now)
+            next_due = min(job.next_run for job in self.jobs)
+            delay = (next_due - datetime.now()).total_seconds()
+            await asyncio.sleep(min(max(delay, 0), MAX_SLEEP_SECONDS))
@@ -0,0 +1,132 @@
+import json
+import logging
+import math
+import os
+from array import array
+from collections import namedtuple
+
+import http_client
+
+SIMPLE_PRICE_URL = "https://api.coingecko.com/api/v3/simple/price"
+# Coin IDs per simple/price request; keeps the query string well under URL limits
+BATCH_SIZE = int(os.environ.get('WATCHLIST_BATCH_SIZE', '100'))
+WATCHLIST_FILE = os.environ.get(
+    'WATCHLIST_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'watchlist.json')
+)
+DEFAULT_WATCHLIST = [
+    {"id": "bitcoin", "name": "Bitcoin", "symbol": "BTC"},
+    {"id": "ethereum", "name": "Ethereum", "symbol": "ETH"},
+]
+NAN = float('nan')
+
+Coin = namedtuple('Coin', 'id name symbol price market_cap volume change_24h change_7d rank')
+
+
+def _coin(entry):
+    if isinstance(entry, str):
+        return {"id": entry, "name": entry.replace('-', ' ').title(), "symbol": entry.upper()}
+    return {"id": entry["id"], "name": entry.get("name", entry["id"]), "symbol": entry.get("symbol", entry["id"]).upper()}
+
+
+def load_watchlist(path=WATCHLIST_FILE):
+    """Return the coins to track from $WATCHLIST (comma-separated IDs), the watchlist file, or the default."""
+    env = os.environ.get('WATCHLIST')
+    if env:
+        return [_coin(coin_id.strip()) for coin_id in env.split(',') if coin_id.strip()]
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return [_coin(entry) for entry in json.load(f)["coins"]]
+    except Exception as e:
+        logging.error(f"Failed to load watchlist from {path}: {e}")
+    return [dict(coin) for coin in DEFAULT_WATCHLIST]
+
+
+def _value(value):
+    return NAN if value is None else float(value)
+
+
+class PriceTable:
+    """Columnar, array-backed table of coin market data; iterating yields Coin rows."""
+
+    columns = ('price', 'market_cap', 'volume', 'change_24h', 'change_7d', 'rank')
+
+    def __init__(self, coins):
+        self.ids = [coin["id"] for coin in coins]
+        self.names = [coin["name"] for coin in coins]
+        self.symbols = [coin["symbol"] for coin in coins]
+        for column in self.columns:
+            setattr(self, column, array('d', [NAN]) * len(coins))
+        self.position = {coin_id: i for i, coin_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield self.row(i)
+
+    def row(self, i):
+        return Coin(self.ids[i], self.names[i], self.symbols[i],
+                    *(getattr(self, column)[i] for column in self.columns))
+
+    def fill_simple_price(self, payload, currency='usd'):
+        """Merge a simple/price response into the table."""
+        for coin_id, quote in payload.items():
+            i = self.position.get(coin_id)
+            if i is None:
+                continue
+            self.price[i] = _value(quote.get(currency))
+            self.market_cap[i] = _value(quote.get(f"{currency}_market_cap"))
+            self.volume[i] = _value(quote.get(f"{currency}_24h_vol"))
+            self.change_24h[i] = _value(quote.get(f"{currency}_24h_change"))
+
+    @classmethod
+    def from_markets(cls, rows):
+        """Build a table from a /coins/markets response."""
+        table = cls([{"id": r["id"], "name": r["name"], "symbol": r["symbol"].upper()} for r in rows])
+        for i, r in enumerate(rows):
+            table.price[i] = _value(r.get("current_price"))
+            table.market_cap[i] = _value(r.get("market_cap"))
+            table.volume[i] = _value(r.get("total_volume"))
+            table.change_24h[i] = _value(r.get("price_change_percentage_24h"))
+            table.change_7d[i] = _value(
+                r.get("price_change_percentage_7d", r.get("price_change_percentage_7d_in_currency"))
+            )
+            table.rank[i] = _value(r.get("market_cap_rank"))
+        return table
+
+
+def fetch_price_table(coins=None, batch_size=BATCH_SIZE, currency='usd'):
+    """Fetch simple/price for every watched coin in parallel batches and merge into one PriceTable."""
+    coins = coins if coins is not None else load_watchlist()
+    table = PriceTable(coins)
+    batches = {
+        f"prices {start // batch_size + 1}": (SIMPLE_PRICE_URL, {
+            "ids": ",".join(table.ids[start:start + batch_size]),
+            "vs_currencies": currency,
+            "include_market_cap": "true",
+            "include_24hr_vol": "true",
+            "include_24hr_change": "true",
+        })
+        for start in range(0, len(table), batch_size)
+    }
+    if not batches:
+        return table
+    results = http_client.fetch_all(batches)
+    if not any(results.values()):
+        return None
+    for payload in results.values():
+        if payload:
+            table.fill_simple_price(payload, currency)
+    return table
+
+
+def format_number(value):
+    """Render a float the way the JSON API sent it: 'N/A' if missing, no trailing .0 on integers."""
+    if math.isnan(value):
+        return 'N/A'
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)